@@ -0,0 +1,103 @@
+"""
+Microbenchmarks for the Gree packet codec.
+
+Compares gree.codec against the string based envelope building, padding and
+unpadding the climate platform used before the codec existed, and reports
+operations per second for each.
+
+    python -m benchmarks.gree_codec [--number N] [--aes-backend NAME]
+"""
+
+import argparse
+import base64
+import timeit
+
+import json
+
+from gree import codec
+
+MAC = 'f4911e7aca59'
+KEY = b'St8Vw1Yz4Bc7Ef0H'
+UID = 0
+COLS = ["Pow", "Mod", "SetTem", "WdSpd", "Air", "Blo", "Health", "SwhSlp",
+        "Lig", "SwingLfRig", "SwUpDn", "Quiet", "Tur", "StHt", "TemUn",
+        "HeatCoolType", "TemRec", "SvSt"]
+VALUES = [1, 1, 24, 0, 0, 0, 1, 0, 1, 0, 2, 0, 0, 0, 0, 0, 0, 0]
+
+
+def legacy_pad(s):
+    aesBlockSize = 16
+    return s + (aesBlockSize - len(s) % aesBlockSize) * chr(aesBlockSize - len(s) % aesBlockSize)
+
+
+def legacy_status_request(cipher):
+    return bytes('{"cid":"app","i":0,"pack":"' + base64.b64encode(cipher.encrypt(legacy_pad('{"cols":' + json.dumps(COLS) + ',"mac":"' + str(MAC) + '","t":"status"}').encode("utf8"))).decode('utf-8') + '","t":"pack","tcid":"' + str(MAC) + '","uid":{}'.format(UID) + '}', "utf-8")
+
+
+def legacy_command_request(cipher):
+    options = dict(zip(COLS, VALUES))
+    statePackJson = '{' + '"opt":["Pow","Mod","SetTem","WdSpd","Air","Blo","Health","SwhSlp","Lig","SwingLfRig","SwUpDn","Quiet","Tur","StHt","TemUn","HeatCoolType","TemRec","SvSt"],"p":[{Pow},{Mod}, {SetTem},{WdSpd},{Air},{Blo},{Health},{SwhSlp},{Lig},{SwingLfRig},{SwUpDn},{Quiet},{Tur},{StHt},{TemUn},{HeatCoolType},{TemRec},{SvSt}],"t":"cmd"'.format(**options) + '}'
+    return bytes('{"cid":"app","i":0,"pack":"' + base64.b64encode(cipher.encrypt(legacy_pad(statePackJson).encode("utf8"))).decode('utf-8') + '","t":"pack","tcid":"' + str(MAC) + '","uid":{}'.format(UID) + '}', "utf-8")
+
+
+def legacy_decode(cipher, data):
+    receivedJson = json.loads(data)
+    decodedPack = cipher.decrypt(base64.b64decode(receivedJson['pack'])).decode("utf-8")
+    replacedPack = decodedPack.replace('\x0f', '').replace(decodedPack[decodedPack.rindex('}')+1:], '')
+    return json.loads(replacedPack)
+
+
+def status_reply(cipher):
+    """Build the reply a unit sends to a status request."""
+    body = json.dumps({'t': 'dat', 'mac': MAC, 'r': 200, 'cols': COLS,
+                             'dat': VALUES}, separators=(',', ':'))
+    pack = base64.b64encode(cipher.encrypt(codec.pad(body.encode('utf-8'))))
+    return json.dumps({'t': 'pack', 'i': 0, 'uid': 0, 'cid': MAC,
+                             'tcid': '', 'pack': pack.decode('ascii')}).encode('utf-8')
+
+
+def run(number, aes_backend=None):
+    start = timeit.default_timer()
+    selected = codec.select_aes_backend(aes_backend)
+    print('AES backend: %s (selected in %.1f ms)' % (
+        selected, (timeit.default_timer() - start) * 1000))
+    print('JSON backend: %s' % codec.json_backend())
+
+    cipher = codec.new_cipher(KEY)
+    gree_codec = codec.GreeCodec(MAC, KEY, UID)
+    reply = status_reply(cipher)
+
+    def codec_decode():
+        gree_codec.decode_pack(codec.json_loads(reply)['pack'])
+
+    cases = [
+        ('status encode', lambda: legacy_status_request(cipher),
+         lambda: gree_codec.status_request(COLS)),
+        ('cmd encode', lambda: legacy_command_request(cipher),
+         lambda: gree_codec.command_request(COLS, VALUES)),
+        ('reply decode', lambda: legacy_decode(cipher, reply), codec_decode),
+    ]
+    assert legacy_decode(cipher, reply) == gree_codec.decode_pack(
+        codec.json_loads(reply)['pack'])
+
+    print('%-14s %14s %14s %8s' % ('case', 'legacy op/s', 'codec op/s', 'speedup'))
+    for name, legacy, current in cases:
+        legacy_rate = number / min(timeit.repeat(legacy, number=number, repeat=3))
+        current_rate = number / min(timeit.repeat(current, number=number, repeat=3))
+        print('%-14s %14.0f %14.0f %7.1fx' % (
+            name, legacy_rate, current_rate, current_rate / legacy_rate))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--number', type=int, default=20000,
+                        help='operations per timing run')
+    parser.add_argument('--aes-backend', choices=codec.AES_BACKENDS,
+                        help='benchmark this AES backend instead of the first '
+                        'installed one of codec.AES_BACKENDS')
+    args = parser.parse_args()
+    run(args.number, args.aes_backend)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,163 @@
+"""
+Fleet-scale load benchmark for the Gree protocol stack.
+
+Starts the local simulator, binds every unit concurrently through the shared
+UDP endpoint and then drives each unit the way GreeClimate does: delta cmd
+packs and status polls serialised through a GreeCommandActor. Reports
+commands per second, p50/p99 command latency and how long the event loop
+was blocked.
+
+    python -m benchmarks.gree_load --units 200 --duration 10 --latency 0.02
+"""
+
+import argparse
+import asyncio
+import random
+import statistics
+
+from gree import codec
+from gree.actor import PRIORITY_COMMAND, GreeCommandActor
+from gree.state import POLL_PROFILES, PROFILE_MINIMAL
+from gree.transport import async_create_endpoint
+
+from .gree_simulator import async_start_simulator, make_units
+
+LAG_INTERVAL = 0.005
+ATTEMPTS = 3
+
+
+class LoopMonitor:
+    """Measures how late the event loop wakes a periodic timer."""
+
+    def __init__(self, loop):
+        self._loop = loop
+        self.lags = []
+        self._task = None
+
+    def start(self):
+        self._task = self._loop.create_task(self._async_run())
+
+    def stop(self):
+        self._task.cancel()
+
+    async def _async_run(self):
+        while True:
+            start = self._loop.time()
+            await asyncio.sleep(LAG_INTERVAL)
+            self.lags.append(max(0.0, self._loop.time() - start - LAG_INTERVAL))
+
+
+def percentile(values, fraction):
+    """Return the value at fraction of the sorted values."""
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+async def async_run(args):
+    loop = asyncio.get_running_loop()
+    poll_columns = POLL_PROFILES[args.profile]
+    units = make_units(args.units)
+    sim_transport, simulator = await async_start_simulator(
+        loop, units, latency=args.latency, loss=args.loss)
+    host, port = sim_transport.get_extra_info('sockname')[:2]
+    endpoint = await async_create_endpoint(loop)
+
+    monitor = LoopMonitor(loop)
+    monitor.start()
+    timeouts = 0
+
+    async def async_request(unit, payload, decode, reply_type):
+        # Resend lost packets like GreeClimate.FetchResult does
+        nonlocal timeouts
+        for attempt in range(ATTEMPTS):
+            try:
+                return await endpoint.async_request(
+                    host, port, unit.mac, payload, decode, reply_type,
+                    timeout=args.timeout)
+            except asyncio.TimeoutError:
+                timeouts += 1
+                if attempt == ATTEMPTS - 1:
+                    raise
+
+    async def async_bind(unit):
+        reply = await async_request(
+            unit, codec.bind_request(unit.mac),
+            lambda pack: codec.decode_pack(codec.generic_cipher(), pack),
+            'bindok')
+        return codec.GreeCodec(unit.mac, reply['key'].encode('utf-8'))
+
+    bind_start = loop.time()
+    codecs = await asyncio.gather(*[async_bind(unit) for unit in units])
+    bind_time = loop.time() - bind_start
+
+    latencies = []
+    failures = 0
+    deadline = loop.time() + args.duration
+
+    async def async_drive(unit, unit_codec):
+        nonlocal failures
+        actor = GreeCommandActor(loop)
+
+        async def async_unit_request(payload, reply_type):
+            return await async_request(unit, payload, unit_codec.decode_pack, reply_type)
+
+        try:
+            while loop.time() < deadline:
+                temperature = random.randint(16, 30)
+                start = loop.time()
+                try:
+                    await actor.async_submit(PRIORITY_COMMAND, lambda: async_unit_request(
+                        unit_codec.command_request(['SetTem'], [temperature]), 'res'))
+                    latencies.append(loop.time() - start)
+                    await actor.async_status(lambda: async_unit_request(
+                        unit_codec.status_request(poll_columns), 'dat'))
+                except asyncio.TimeoutError:
+                    failures += 1
+                if args.think:
+                    await asyncio.sleep(args.think)
+        finally:
+            actor.async_stop()
+
+    run_start = loop.time()
+    await asyncio.gather(*[async_drive(unit, unit_codec)
+                           for unit, unit_codec in zip(units, codecs)])
+    run_time = loop.time() - run_start
+
+    monitor.stop()
+    endpoint.close()
+    sim_transport.close()
+
+    print('units:                 %d' % args.units)
+    print('poll profile:          %s (%d columns)' % (args.profile, len(poll_columns)))
+    print('bind all units:        %.3f s' % bind_time)
+    print('commands:              %d (%d failed)' % (len(latencies), failures))
+    print('timeouts:              %d (%d replies dropped)' % (timeouts, simulator.dropped))
+    print('commands per second:   %.0f' % (len(latencies) / run_time))
+    if latencies:
+        print('command latency p50:   %.2f ms' % (percentile(latencies, 0.50) * 1000))
+        print('command latency p99:   %.2f ms' % (percentile(latencies, 0.99) * 1000))
+    if monitor.lags:
+        print('loop lag mean/max:     %.2f / %.2f ms' % (
+            statistics.mean(monitor.lags) * 1000, max(monitor.lags) * 1000))
+        print('loop blocked total:    %.3f s' % sum(monitor.lags))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--units', type=int, default=100)
+    parser.add_argument('--duration', type=float, default=5.0)
+    parser.add_argument('--latency', type=float, default=0.01,
+                        help='mean simulated reply latency in seconds')
+    parser.add_argument('--loss', type=float, default=0.0,
+                        help='fraction of replies the simulator drops')
+    parser.add_argument('--timeout', type=float, default=1.0,
+                        help='per-attempt reply timeout in seconds')
+    parser.add_argument('--profile', choices=sorted(POLL_PROFILES),
+                        default=PROFILE_MINIMAL, help='status poll column profile')
+    parser.add_argument('--think', type=float, default=0.0,
+                        help='pause between commands per unit in seconds')
+    asyncio.run(async_run(parser.parse_args()))
+
+
+if __name__ == '__main__':
+    main()
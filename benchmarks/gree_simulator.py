@@ -0,0 +1,158 @@
+"""
+Local stand-in for a fleet of Gree units.
+
+One UDP endpoint answers for any number of simulated units, each with its own
+MAC and device key. It speaks the scan, bind, status and cmd packets the
+climate platform sends, with the same AES-ECB and base64 framing, and can add
+latency and drop packets.
+
+    python -m benchmarks.gree_simulator --units 200 --latency 0.02 --loss 0.01
+"""
+
+import argparse
+import asyncio
+import base64
+import logging
+import random
+
+from gree import codec
+
+_LOGGER = logging.getLogger(__name__)
+
+DEFAULT_PORT = 7000
+DEFAULT_STATE = {
+    'Pow': 1, 'Mod': 1, 'SetTem': 24, 'WdSpd': 0, 'Air': 0, 'Blo': 0,
+    'Health': 1, 'SwhSlp': 0, 'Lig': 1, 'SwingLfRig': 0, 'SwUpDn': 2,
+    'Quiet': 0, 'Tur': 0, 'StHt': 0, 'TemUn': 0, 'HeatCoolType': 0,
+    'TemRec': 0, 'SvSt': 0, 'TemSen': 64,
+}
+
+
+class SimulatedUnit:
+    """State and key of one simulated unit."""
+
+    def __init__(self, mac, name):
+        self.mac = mac
+        self.name = name
+        self.key = ''.join(random.choice('ABCDEFGHabcdefgh0123456789')
+                           for _ in range(16))
+        self.cipher = codec.new_cipher(self.key.encode('utf-8'))
+        self.state = dict(DEFAULT_STATE)
+        self.requests = 0
+
+    def handle(self, body):
+        """Return the reply body for a decrypted request body."""
+        self.requests += 1
+        if body.get('t') == 'status':
+            return {'t': 'dat', 'mac': self.mac, 'r': 200, 'cols': body['cols'],
+                    'dat': [self.state.get(col, 0) for col in body['cols']]}
+        if body.get('t') == 'cmd':
+            self.state.update(zip(body['opt'], body['p']))
+            return {'t': 'res', 'mac': self.mac, 'r': 200, 'opt': body['opt'],
+                    'p': body['p'], 'val': body['p']}
+        return None
+
+
+class GreeSimulator(asyncio.DatagramProtocol):
+    """UDP endpoint answering for many simulated units."""
+
+    def __init__(self, loop, units, latency=0.0, loss=0.0):
+        self._loop = loop
+        self._transport = None
+        self.units = {unit.mac: unit for unit in units}
+        self.latency = latency
+        self.loss = loss
+        self.received = 0
+        self.dropped = 0
+
+    def connection_made(self, transport):
+        self._transport = transport
+
+    def datagram_received(self, data, addr):
+        self.received += 1
+        try:
+            envelope = codec.json_loads(data)
+        except ValueError:
+            return
+        if envelope.get('t') == 'scan':
+            for unit in self.units.values():
+                self._reply(addr, unit, codec.generic_cipher(), 1, {
+                    't': 'dev', 'cid': unit.mac, 'mac': unit.mac,
+                    'name': unit.name, 'brand': 'gree', 'ver': 'V1.1.13'})
+            return
+        unit = self.units.get(envelope.get('tcid'))
+        if unit is None or 'pack' not in envelope:
+            return
+        if envelope.get('i') == 1:
+            body = codec.decode_pack(codec.generic_cipher(), envelope['pack'])
+            if body.get('t') == 'bind':
+                self._reply(addr, unit, codec.generic_cipher(), 1, {
+                    't': 'bindok', 'mac': unit.mac, 'key': unit.key, 'r': 200})
+            return
+        try:
+            body = codec.decode_pack(unit.cipher, envelope['pack'])
+        except ValueError:
+            return
+        reply = unit.handle(body)
+        if reply is not None:
+            self._reply(addr, unit, unit.cipher, 0, reply)
+
+    def _reply(self, addr, unit, cipher, index, body):
+        if self.loss and random.random() < self.loss:
+            self.dropped += 1
+            return
+        pack = base64.b64encode(cipher.encrypt(codec.pad(codec.json_dumps(body))))
+        datagram = codec.json_dumps({
+            't': 'pack', 'i': index, 'uid': 0, 'cid': unit.mac, 'tcid': '',
+            'pack': pack.decode('ascii')})
+        if self.latency:
+            delay = random.uniform(self.latency / 2, self.latency * 1.5)
+            self._loop.call_later(delay, self._send, datagram, addr)
+        else:
+            self._send(datagram, addr)
+
+    def _send(self, datagram, addr):
+        if self._transport is not None:
+            self._transport.sendto(datagram, addr)
+
+
+def make_units(count):
+    """Return count units with distinct MACs."""
+    return [SimulatedUnit('f4911e%06x' % index, 'sim%d' % index)
+            for index in range(count)]
+
+
+async def async_start_simulator(loop, units, host='127.0.0.1', port=0,
+                                latency=0.0, loss=0.0):
+    """Start a simulator and return (transport, protocol)."""
+    return await loop.create_datagram_endpoint(
+        lambda: GreeSimulator(loop, units, latency, loss),
+        local_addr=(host, port))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--units', type=int, default=10)
+    parser.add_argument('--latency', type=float, default=0.0,
+                        help='mean reply latency in seconds')
+    parser.add_argument('--loss', type=float, default=0.0,
+                        help='fraction of replies to drop')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    loop = asyncio.new_event_loop()
+    units = make_units(args.units)
+    loop.run_until_complete(async_start_simulator(
+        loop, units, args.host, args.port, args.latency, args.loss))
+    for unit in units:
+        _LOGGER.info('Simulating %s (%s) with key %s', unit.name, unit.mac, unit.key)
+    try:
+        loop.run_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,171 @@
+"""
+Event-loop blocking and request volume benchmark for the Z-Way platform.
+
+Runs the local Z-Way simulator in its own thread and, for each node count,
+drives the three thermostat operations the platform performs: the startup
+read done in async_added_to_hass, a burst of slider moves through
+async_set_temperature and an update() cycle. The blocking requests.get
+calls the platform used to make are compared with the shared ZwayClient
+using the ZAutomation coordinator, the ZWaveAPI/Data engine, the batched
+ZWaveAPI/Run reader and the setpoint write queue. Reports HTTP requests,
+wall time and how long the event loop was blocked for each.
+
+    python -m benchmarks.zway_load --nodes 5 20 50 --latency 0.02
+"""
+
+import argparse
+import asyncio
+import threading
+
+import requests
+
+from zway.batch import ZwayBatchReader
+from zway.client import ZwayClient, thermostat_device_id
+from zway.coordinator import ZwayCoordinator
+from zway.delta import ZwayDataEngine
+from zway.writer import ZwayWriteQueue
+
+from .gree_load import LAG_INTERVAL, LoopMonitor
+from .zway_simulator import ZwaySimulator, async_start_simulator
+
+SLIDER_STEPS = 5
+TIMEOUT = 10
+
+
+def start_simulator_thread(simulator):
+    """Serve simulator from a thread and return (loop, runner, URL)."""
+    loop = asyncio.new_event_loop()
+    started = threading.Event()
+    result = {}
+
+    def run():
+        asyncio.set_event_loop(loop)
+        result['runner'], result['url'] = loop.run_until_complete(
+            async_start_simulator(simulator))
+        started.set()
+        loop.run_forever()
+
+    threading.Thread(target=run, daemon=True).start()
+    started.wait()
+    return loop, result['runner'], result['url']
+
+
+async def legacy_read(url, node):
+    """Read a setpoint the way async_added_to_hass and update() did."""
+    data = requests.get(url + '/ZAutomation/api/v1/devices/' +
+                        thermostat_device_id(node), timeout=TIMEOUT)
+    return float(data.json()['data']['metrics']['level'])
+
+
+async def legacy_set(url, node, level):
+    """Send a setpoint the way async_set_temperature did."""
+    requests.get(url + '/ZAutomation/api/v1/devices/' +
+                 thermostat_device_id(node) + '/command/exact?level=' +
+                 str(level), timeout=TIMEOUT)
+
+
+async def async_measure(monitor, simulator, run):
+    """Run the coroutine function run and return its cost."""
+    loop = asyncio.get_running_loop()
+    first_lag = len(monitor.lags)
+    first_request = sum(simulator.requests.values())
+    start = loop.time()
+    await run()
+    elapsed = loop.time() - start
+    # Let the monitor record the lag of the last blocking call
+    await asyncio.sleep(LAG_INTERVAL * 2)
+    lags = monitor.lags[first_lag:]
+    return (sum(simulator.requests.values()) - first_request, elapsed,
+            sum(lags), max(lags, default=0.0))
+
+
+async def async_run_nodes(args, nodes):
+    simulator = ZwaySimulator(nodes, args.latency)
+    sim_loop, runner, url = start_simulator_thread(simulator)
+    node_ids = list(simulator.valves)
+    loop = asyncio.get_running_loop()
+    monitor = LoopMonitor(loop)
+    monitor.start()
+    client = ZwayClient(url, args.max_connections)
+
+    async def legacy_startup():
+        await asyncio.gather(*[legacy_read(url, node) for node in node_ids])
+
+    async def legacy_slider():
+        await asyncio.gather(*[legacy_set(url, node, 18 + step * 0.5)
+                               for step in range(SLIDER_STEPS)
+                               for node in node_ids])
+
+    async def async_send(node, value):
+        await client.async_command(thermostat_device_id(node), 'exact',
+                                   level=str(value))
+
+    writer = ZwayWriteQueue(loop, async_send, args.write_delay)
+
+    async def queued_slider():
+        for step in range(SLIDER_STEPS):
+            for node in node_ids:
+                writer.async_write(node, 18 + step * 0.5)
+            await asyncio.sleep(0)
+        await writer.async_flush()
+
+    def refresh_all(source):
+        async def run():
+            await asyncio.gather(*[source.async_refresh() for _ in node_ids])
+        return run
+
+    coordinator = ZwayCoordinator(client)
+    engine = ZwayDataEngine(client)
+    batch = ZwayBatchReader(client)
+    for node in node_ids:
+        engine.async_watch(node)
+        batch.async_watch(node)
+
+    cases = [
+        ('legacy requests', [('startup', legacy_startup),
+                             ('slider', legacy_slider),
+                             ('update', legacy_startup)]),
+        ('client+devices', [('startup', refresh_all(coordinator)),
+                            ('slider', queued_slider),
+                            ('update', refresh_all(coordinator))]),
+        ('client+zwaveapi', [('startup', refresh_all(engine)),
+                             ('update', refresh_all(engine))]),
+        ('client+run', [('startup', refresh_all(batch)),
+                        ('update', refresh_all(batch))]),
+    ]
+    print('%d nodes, %.0f ms latency' % (nodes, args.latency * 1000))
+    print('%-16s %-8s %9s %10s %12s %10s' % (
+        'mode', 'op', 'requests', 'wall ms', 'blocked ms', 'max lag'))
+    for mode, operations in cases:
+        for operation, run in operations:
+            count, elapsed, blocked, max_lag = await async_measure(
+                monitor, simulator, run)
+            print('%-16s %-8s %9d %10.1f %12.1f %10.1f' % (
+                mode, operation, count, elapsed * 1000, blocked * 1000,
+                max_lag * 1000))
+    print()
+
+    monitor.stop()
+    await client.async_close()
+    asyncio.run_coroutine_threadsafe(runner.cleanup(), sim_loop).result()
+    sim_loop.call_soon_threadsafe(sim_loop.stop)
+
+
+async def async_run(args):
+    for nodes in args.nodes:
+        await async_run_nodes(args, nodes)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--nodes', type=int, nargs='+', default=[5, 20, 50])
+    parser.add_argument('--latency', type=float, default=0.02,
+                        help='mean simulated response latency in seconds')
+    parser.add_argument('--max-connections', type=int, default=4)
+    parser.add_argument('--write-delay', type=float, default=0.1,
+                        help='setpoint write queue delay in seconds')
+    asyncio.run(async_run(parser.parse_args()))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,258 @@
+"""
+Local stand-in for a Z-Way controller with many thermostat valves.
+
+Serves the parts of the ZAutomation and ZWaveAPI HTTP APIs the zway platform
+uses: login, device reads (single and ``devices?since=``), ``command/exact``,
+``ZWaveAPI/Run`` value and batch expressions, ``ZWaveAPI/Data/<updateTime>``
+and the websocket level_update feed. Latency and error rate are configurable
+and every request is counted by kind.
+
+    python -m benchmarks.zway_simulator --nodes 20 --latency 0.05 --errors 0.01
+"""
+
+import argparse
+import asyncio
+import collections
+import json
+import logging
+import random
+import re
+import time
+
+from aiohttp import web
+
+_LOGGER = logging.getLogger(__name__)
+
+DEFAULT_PORT = 8083
+FIRST_NODE = 2
+DEVICE_ID = re.compile(r'^ZWayVDev_zway_(\d+)-0-(67-1|128)$')
+RUN_VALUE = re.compile(
+    r'^devices\[(\d+)\]\.instances\[0\]\.commandClasses\[(\d+)\]\.data'
+    r'(?:\[1\]\.(val\.value|modeName\.value|modeName)|\.last\.value)$')
+RUN_BATCH = re.compile(r'^\[([\d,]+)\]\.map\(function\(n\)\{.*\}\)$')
+RUN_SET = re.compile(
+    r'^devices\[(\d+)\]\.instances\[0\]\.commandClasses\[67\]\.data\[1\]'
+    r'\.setVal=([\d.]+)$')
+
+
+class SimulatedValve:
+    """Setpoint, mode and battery of one simulated valve."""
+
+    def __init__(self, node):
+        self.node = node
+        self.setpoint = 21.0
+        self.mode_name = 'Heating'
+        self.battery = random.randint(40, 100)
+        self.setpoint_time = self.battery_time = int(time.time())
+
+    def thermostat_device(self):
+        return {'id': 'ZWayVDev_zway_{}-0-67-1'.format(self.node),
+                'deviceType': 'thermostat',
+                'probeType': 'thermostat_set_point',
+                'updateTime': self.setpoint_time,
+                'metrics': {'level': self.setpoint, 'scaleTitle': '°C',
+                            'title': 'Danfoss {}'.format(self.node)}}
+
+    def battery_device(self):
+        return {'id': 'ZWayVDev_zway_{}-0-128'.format(self.node),
+                'deviceType': 'battery', 'probeType': 'battery',
+                'updateTime': self.battery_time,
+                'metrics': {'level': self.battery, 'scaleTitle': '%'}}
+
+    def command_classes(self):
+        return {
+            '67': {'data': {'1': {
+                'val': {'value': self.setpoint,
+                        'updateTime': self.setpoint_time},
+                'modeName': {'value': self.mode_name,
+                             'updateTime': self.setpoint_time}}}},
+            '128': {'data': {'last': {'value': self.battery,
+                                      'updateTime': self.battery_time}}},
+        }
+
+
+class ZwaySimulator:
+    """aiohttp application answering for a set of valves."""
+
+    def __init__(self, nodes, latency=0.0, errors=0.0, login=None,
+                 password=None):
+        self.valves = {node: SimulatedValve(node)
+                       for node in range(FIRST_NODE, FIRST_NODE + nodes)}
+        self.latency = latency
+        self.errors = errors
+        self.login = login
+        self.password = password
+        self.sessions = set()
+        self.requests = collections.Counter()
+        self.websockets = set()
+        self.app = web.Application(middlewares=[self._middleware])
+        self.app.router.add_post('/ZAutomation/api/v1/login', self._login)
+        self.app.router.add_get('/ZAutomation/api/v1/devices', self._devices)
+        self.app.router.add_get(
+            '/ZAutomation/api/v1/devices/{device_id}', self._device)
+        self.app.router.add_get(
+            '/ZAutomation/api/v1/devices/{device_id}/command/exact',
+            self._command_exact)
+        self.app.router.add_get('/ZWaveAPI/Run/{expression:.+}', self._run)
+        self.app.router.add_get('/ZWaveAPI/Data/{since}', self._data)
+        self.app.router.add_get('/', self._websocket)
+
+    @web.middleware
+    async def _middleware(self, request, handler):
+        self.requests[request.match_info.route.handler.__name__.strip('_')] += 1
+        if self.latency:
+            await asyncio.sleep(random.uniform(self.latency / 2,
+                                               self.latency * 1.5))
+        if self.errors and random.random() < self.errors:
+            raise web.HTTPInternalServerError()
+        if (self.login is not None and handler != self._login
+                and request.headers.get('ZWAYSession') not in self.sessions):
+            raise web.HTTPUnauthorized()
+        return await handler(request)
+
+    def _valve(self, device_id):
+        match = DEVICE_ID.match(device_id)
+        valve = match and self.valves.get(int(match.group(1)))
+        if valve is None:
+            raise web.HTTPNotFound()
+        return valve, match.group(2)
+
+    async def _login(self, request):
+        body = await request.json()
+        if (body.get('login'), body.get('password')) != (self.login,
+                                                         self.password):
+            raise web.HTTPUnauthorized()
+        sid = '%032x' % random.getrandbits(128)
+        self.sessions.add(sid)
+        return web.json_response({'code': 200, 'data': {'sid': sid}})
+
+    async def _devices(self, request):
+        since = int(request.query.get('since', 0))
+        devices = []
+        for valve in self.valves.values():
+            for device in (valve.thermostat_device(), valve.battery_device()):
+                if device['updateTime'] >= since:
+                    devices.append(device)
+        return web.json_response({'code': 200, 'data': {
+            'structureChanged': since == 0, 'updateTime': int(time.time()),
+            'devices': devices}})
+
+    async def _device(self, request):
+        valve, kind = self._valve(request.match_info['device_id'])
+        device = (valve.thermostat_device() if kind == '67-1'
+                  else valve.battery_device())
+        return web.json_response({'code': 200, 'data': device})
+
+    async def _command_exact(self, request):
+        valve, kind = self._valve(request.match_info['device_id'])
+        if kind != '67-1':
+            raise web.HTTPNotFound()
+        self._set(valve, float(request.query['level']))
+        return web.json_response({'code': 200, 'data': None})
+
+    def _set(self, valve, setpoint):
+        valve.setpoint = setpoint
+        valve.setpoint_time = int(time.time())
+        message = json.dumps({'event': 'me.z-wave.devices.level_update',
+                              'data': json.dumps(valve.thermostat_device())})
+        for websocket in list(self.websockets):
+            asyncio.ensure_future(websocket.send_str(message))
+
+    def _evaluate(self, expression):
+        match = RUN_BATCH.match(expression)
+        if match:
+            rows = []
+            for node in match.group(1).split(','):
+                valve = self.valves.get(int(node))
+                rows.append(None if valve is None else [
+                    valve.setpoint, valve.mode_name, valve.battery])
+            return rows
+        match = RUN_SET.match(expression)
+        if match:
+            valve = self.valves.get(int(match.group(1)))
+            if valve is None:
+                raise web.HTTPNotFound()
+            self._set(valve, float(match.group(2)))
+            return None
+        match = RUN_VALUE.match(expression)
+        valve = match and self.valves.get(int(match.group(1)))
+        if valve is None:
+            raise web.HTTPBadRequest(text='Unsupported expression')
+        if match.group(2) == '128':
+            return valve.battery
+        if match.group(3) == 'val.value':
+            return valve.setpoint
+        return valve.mode_name
+
+    async def _run(self, request):
+        return web.json_response(self._evaluate(request.match_info['expression']))
+
+    async def _data(self, request):
+        since = int(request.match_info['since'])
+        now = int(time.time())
+        if since == 0:
+            return web.json_response({'updateTime': now, 'devices': {
+                str(node): {'instances': {'0': {
+                    'commandClasses': valve.command_classes()}}}
+                for node, valve in self.valves.items()}})
+        changes = {'updateTime': now}
+        for node, valve in self.valves.items():
+            prefix = 'devices.{}.instances.0.commandClasses.'.format(node)
+            classes = valve.command_classes()
+            if valve.setpoint_time >= since:
+                changes[prefix + '67.data.1'] = classes['67']['data']['1']
+            if valve.battery_time >= since:
+                changes[prefix + '128.data.last'] = classes['128']['data']['last']
+        return web.json_response(changes)
+
+    async def _websocket(self, request):
+        websocket = web.WebSocketResponse()
+        await websocket.prepare(request)
+        self.websockets.add(websocket)
+        try:
+            async for _ in websocket:
+                pass
+        finally:
+            self.websockets.discard(websocket)
+        return websocket
+
+
+async def async_start_simulator(simulator, host='127.0.0.1', port=0):
+    """Serve simulator and return (runner, base URL)."""
+    runner = web.AppRunner(simulator.app)
+    await runner.setup()
+    site = web.TCPSite(runner, host, port)
+    await site.start()
+    port = runner.addresses[0][1]
+    return runner, 'http://{}:{}'.format(host, port)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--nodes', type=int, default=10)
+    parser.add_argument('--latency', type=float, default=0.0,
+                        help='mean response latency in seconds')
+    parser.add_argument('--errors', type=float, default=0.0,
+                        help='fraction of requests answered with HTTP 500')
+    parser.add_argument('--login', help='require this login')
+    parser.add_argument('--password', help='password for --login')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    simulator = ZwaySimulator(args.nodes, args.latency, args.errors,
+                              args.login, args.password)
+    loop = asyncio.new_event_loop()
+    _, url = loop.run_until_complete(
+        async_start_simulator(simulator, args.host, args.port))
+    _LOGGER.info('Simulating nodes %s on %s', ', '.join(
+        str(node) for node in simulator.valves), url)
+    try:
+        loop.run_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
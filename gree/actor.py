@@ -0,0 +1,74 @@
+"""
+Per-unit command actor for Gree units.
+
+All requests to one unit run one at a time from a priority queue, so replies
+never interleave and user commands overtake background polls. Concurrent
+status reads share a single in-flight request.
+"""
+
+import asyncio
+import itertools
+
+PRIORITY_COMMAND = 0
+PRIORITY_POLL = 1
+
+
+class GreeCommandActor:
+    """Serialised request queue of one unit."""
+
+    def __init__(self, loop):
+        self._loop = loop
+        self._queue = asyncio.PriorityQueue()
+        self._sequence = itertools.count()
+        self._worker = None
+        self._status = None
+
+    def _enqueue(self, priority, request):
+        future = self._loop.create_future()
+        self._queue.put_nowait((priority, next(self._sequence), request, future))
+        if self._worker is None:
+            self._worker = self._loop.create_task(self._async_work())
+        return future
+
+    async def async_submit(self, priority, request):
+        """Queue the coroutine function request and return its result."""
+        return await self._enqueue(priority, request)
+
+    async def async_status(self, request):
+        """Run a status read, joining the one already queued or in flight."""
+        if self._status is None:
+            self._status = self._enqueue(PRIORITY_POLL, request)
+            self._status.add_done_callback(self._status_done)
+        return await asyncio.shield(self._status)
+
+    def _status_done(self, future):
+        if self._status is future:
+            self._status = None
+
+    def async_stop(self):
+        """Stop the worker and fail everything still queued."""
+        if self._worker is not None:
+            self._worker.cancel()
+            self._worker = None
+        while not self._queue.empty():
+            future = self._queue.get_nowait()[3]
+            if not future.done():
+                future.cancel()
+
+    async def _async_work(self):
+        while True:
+            _, _, request, future = await self._queue.get()
+            if future.done():
+                continue
+            try:
+                result = await request()
+            except asyncio.CancelledError:
+                if not future.done():
+                    future.cancel()
+                raise
+            except Exception as exc:  # pylint: disable=broad-except
+                if not future.done():
+                    future.set_exception(exc)
+            else:
+                if not future.done():
+                    future.set_result(result)
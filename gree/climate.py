@@ -1,30 +1,29 @@
 #!/usr/bin/python
 # Do basic imports
-import importlib.util
-import socket
-import base64
-import re
-import sys
-
 import asyncio
 import logging
-import binascii
-import os.path
 import voluptuous as vol
 import homeassistant.helpers.config_validation as cv
 
 from homeassistant.components.climate import (ClimateDevice, PLATFORM_SCHEMA,
 SUPPORT_OPERATION_MODE, SUPPORT_FAN_MODE, SUPPORT_SWING_MODE)
 from homeassistant.components.climate.const import (
-SUPPORT_TARGET_TEMPERATURE, SUPPORT_ON_OFF)
-from homeassistant.const import (ATTR_UNIT_OF_MEASUREMENT, ATTR_TEMPERATURE, CONF_NAME, CONF_HOST, CONF_PORT, CONF_MAC, CONF_TIMEOUT, CONF_CUSTOMIZE, STATE_ON, STATE_OFF, STATE_UNKNOWN)
+SUPPORT_TARGET_TEMPERATURE, SUPPORT_ON_OFF, ATTR_CURRENT_TEMPERATURE, ATTR_OPERATION_MODE, ATTR_FAN_MODE, ATTR_SWING_MODE)
+from homeassistant.const import (ATTR_UNIT_OF_MEASUREMENT, TEMP_CELSIUS, ATTR_TEMPERATURE, ATTR_ENTITY_ID, CONF_NAME, CONF_HOST, CONF_PORT, CONF_MAC, CONF_TIMEOUT, CONF_CUSTOMIZE, STATE_ON, STATE_OFF, STATE_UNKNOWN, EVENT_HOMEASSISTANT_STOP)
 from homeassistant.helpers.event import (async_track_state_change)
 from homeassistant.core import callback
+from homeassistant.exceptions import PlatformNotReady
 #from homeassistant.helpers.restore_state import async_get_last_state
 from homeassistant.helpers.restore_state import RestoreEntity
-from configparser import ConfigParser
-from Crypto.Cipher import AES
-import simplejson
+
+from .actor import PRIORITY_COMMAND, GreeCommandActor
+from .codec import GreeCodec, SCAN_REQUEST, bind_request, decode_pack, generic_cipher
+from .gateway import GreeGateway
+from .keystore import GreeKeyStore
+from .metrics import GreeMetrics
+from .scheduler import DEFAULT_POLL_BUDGET, GreePollScheduler
+from .state import POLL_PROFILES, PROFILE_FULL, PROFILE_MINIMAL, SENSOR_COLUMNS, TEMSEN_OFFSET, GreeState
+from .transport import GreeDecryptError, async_create_endpoint
 
 REQUIREMENTS = ['pycryptodome']
 
@@ -45,10 +44,38 @@ CONF_DEFAULT_FAN_MODE = 'default_fan_mode'
 CONF_DEFAULT_SWING_UPDN_MODE = 'default_swing_updn_mode'
 CONF_ENCRYPTION_KEY = 'encryption_key'
 CONF_UID = 'uid'
+CONF_DISCOVERY = 'discovery'
+CONF_BROADCAST_ADDRESS = 'broadcast_address'
+CONF_MIN_POLL_INTERVAL = 'min_poll_interval'
+CONF_MAX_POLL_INTERVAL = 'max_poll_interval'
+CONF_POLL_BUDGET = 'poll_budget'
+CONF_METRICS = 'metrics'
+CONF_GATEWAY = 'gateway'
+CONF_POLL_PROFILE = 'poll_profile'
+CONF_FULL_POLL_EVERY = 'full_poll_every'
+
+DOMAIN = 'gree'
+SERVICE_SET_OPTIONS = 'set_options'
+EVENT_SET_OPTIONS_RESULT = 'gree_set_options_result'
+ATTR_POWER = 'power'
 
 CONF_DEFAULT_OPERATION_FROM_IDLE = 'default_operation_from_idle'
 
+DATA_GREE_TRANSPORT = 'gree_transport'
+DATA_GREE_KEYS = 'gree_keys'
+DATA_GREE_SCHEDULER = 'gree_scheduler'
+DATA_GREE_ENTITIES = 'gree_entities'
+
 DEFAULT_NAME = 'Gree Climate'
+COMMAND_COALESCE_DELAY = 0.2
+# Exposed metrics are rewritten at most this often in seconds when nothing else changed
+METRICS_WRITE_INTERVAL = 60
+REQUEST_TYPES = {'dat': 'status', 'res': 'cmd', 'bindok': 'bind'}
+DEFAULT_PORT = 7000
+DEFAULT_BROADCAST_ADDRESS = '255.255.255.255'
+DEFAULT_MIN_POLL_INTERVAL = 5
+DEFAULT_MAX_POLL_INTERVAL = 300
+DEFAULT_FULL_POLL_EVERY = 20
 DEFAULT_TIMEOUT = 10
 DEFAULT_RETRY = 3
 DEFAULT_MIN_TEMP = 16
@@ -70,9 +97,18 @@ CUSTOMIZE_SCHEMA = vol.Schema({
 
 PLATFORM_SCHEMA = PLATFORM_SCHEMA.extend({
     vol.Optional(CONF_NAME, default=DEFAULT_NAME): cv.string,
-    vol.Required(CONF_HOST): cv.string,
-    vol.Required(CONF_PORT): cv.positive_int,
-    vol.Required(CONF_MAC): cv.string,
+    vol.Optional(CONF_HOST): cv.string,
+    vol.Optional(CONF_PORT, default=DEFAULT_PORT): cv.positive_int,
+    vol.Optional(CONF_MAC): cv.string,
+    vol.Optional(CONF_DISCOVERY, default=False): cv.boolean,
+    vol.Optional(CONF_BROADCAST_ADDRESS, default=DEFAULT_BROADCAST_ADDRESS): cv.string,
+    vol.Optional(CONF_MIN_POLL_INTERVAL, default=DEFAULT_MIN_POLL_INTERVAL): cv.positive_int,
+    vol.Optional(CONF_MAX_POLL_INTERVAL, default=DEFAULT_MAX_POLL_INTERVAL): cv.positive_int,
+    vol.Optional(CONF_POLL_BUDGET, default=DEFAULT_POLL_BUDGET): cv.positive_int,
+    vol.Optional(CONF_METRICS, default=False): cv.boolean,
+    vol.Optional(CONF_GATEWAY, default=False): cv.boolean,
+    vol.Optional(CONF_POLL_PROFILE, default=PROFILE_MINIMAL): vol.In(POLL_PROFILES),
+    vol.Optional(CONF_FULL_POLL_EVERY, default=DEFAULT_FULL_POLL_EVERY): cv.positive_int,
     vol.Optional(CONF_TIMEOUT, default=DEFAULT_TIMEOUT): cv.positive_int, 
     vol.Optional(CONF_MIN_TEMP, default=DEFAULT_MIN_TEMP): cv.positive_int,
     vol.Optional(CONF_MAX_TEMP, default=DEFAULT_MAX_TEMP): cv.positive_int,
@@ -88,36 +124,186 @@ PLATFORM_SCHEMA = PLATFORM_SCHEMA.extend({
     vol.Optional(CONF_UID): cv.positive_int
 })
 
-@asyncio.coroutine
-def async_setup_platform(hass, config, async_add_devices, discovery_info=None):
+SET_OPTIONS_SCHEMA = vol.Schema({
+    vol.Required(ATTR_ENTITY_ID): cv.entity_ids,
+    vol.Optional(ATTR_POWER): cv.boolean,
+    vol.Optional(ATTR_OPERATION_MODE): cv.string,
+    vol.Optional(ATTR_TEMPERATURE): vol.Coerce(float),
+    vol.Optional(ATTR_FAN_MODE): cv.string,
+    vol.Optional(ATTR_SWING_MODE): cv.string,
+})
+
+async def async_setup_platform(hass, config, async_add_devices, discovery_info=None):
     name = config.get(CONF_NAME)
     ip_addr = config.get(CONF_HOST)
     port = config.get(CONF_PORT)
-    mac_addr = config.get(CONF_MAC).encode().replace(b':', b'')
-      
-    min_temp = config.get(CONF_MIN_TEMP)
-    max_temp = config.get(CONF_MAX_TEMP)
-    target_temp = config.get(CONF_TARGET_TEMP)
-    target_temp_step = config.get(CONF_TARGET_TEMP_STEP)
-    temp_sensor_entity_id = config.get(CONF_TEMP_SENSOR)
-    operation_list = config.get(CONF_CUSTOMIZE).get(CONF_OPERATIONS, []) or DEFAULT_OPERATION_LIST
-    fan_list = config.get(CONF_CUSTOMIZE).get(CONF_FAN_MODES, []) or DEFAULT_FAN_MODE_LIST
-    swing_updn_mode_list = config.get(CONF_CUSTOMIZE).get(CONF_SWING_UPDN_MODES, []) or DEFAULT_SWING_UPDN_MODES
-    default_operation = config.get(CONF_DEFAULT_OPERATION)
-    default_fan_mode = config.get(CONF_DEFAULT_FAN_MODE)
-    default_swing_updn_mode = config.get(CONF_DEFAULT_SWING_UPDN_MODE)
+    discovery = config.get(CONF_DISCOVERY)
+
+    if not discovery and not (ip_addr and config.get(CONF_MAC)):
+        _LOGGER.error('Either %s and %s or %s must be configured', CONF_HOST, CONF_MAC, CONF_DISCOVERY)
+        return
+    if config.get(CONF_GATEWAY) and not (ip_addr and config.get(CONF_MAC)):
+        _LOGGER.error('%s requires %s and %s', CONF_GATEWAY, CONF_HOST, CONF_MAC)
+        return
+
     encryption_key = config.get(CONF_ENCRYPTION_KEY)
     uid = config.get(CONF_UID)
-    
-    default_operation_from_idle = config.get(CONF_DEFAULT_OPERATION_FROM_IDLE)
-        
-    async_add_devices([
-        GreeClimate(hass, name, ip_addr, port, mac_addr, min_temp, max_temp, target_temp, target_temp_step, temp_sensor_entity_id, operation_list, fan_list, swing_updn_mode_list, default_operation, default_fan_mode, default_operation_from_idle, default_swing_updn_mode, encryption_key, uid)
-    ])
+    min_poll_interval = config.get(CONF_MIN_POLL_INTERVAL)
+    max_poll_interval = config.get(CONF_MAX_POLL_INTERVAL)
+
+    # Options shared by every entity of this platform entry, so the call sites below only pass what differs per unit
+    options = dict(
+        min_temp=config.get(CONF_MIN_TEMP),
+        max_temp=config.get(CONF_MAX_TEMP),
+        target_temp=config.get(CONF_TARGET_TEMP),
+        target_temp_step=config.get(CONF_TARGET_TEMP_STEP),
+        temp_sensor_entity_id=config.get(CONF_TEMP_SENSOR),
+        operation_list=config.get(CONF_CUSTOMIZE).get(CONF_OPERATIONS, []) or DEFAULT_OPERATION_LIST,
+        fan_list=config.get(CONF_CUSTOMIZE).get(CONF_FAN_MODES, []) or DEFAULT_FAN_MODE_LIST,
+        swing_updn_mode_list=config.get(CONF_CUSTOMIZE).get(CONF_SWING_UPDN_MODES, []) or DEFAULT_SWING_UPDN_MODES,
+        default_operation=config.get(CONF_DEFAULT_OPERATION),
+        default_fan_mode=config.get(CONF_DEFAULT_FAN_MODE),
+        default_operation_from_idle=config.get(CONF_DEFAULT_OPERATION_FROM_IDLE),
+        default_swing_updn_mode=config.get(CONF_DEFAULT_SWING_UPDN_MODE),
+        uid=uid,
+        min_poll_interval=min_poll_interval,
+        max_poll_interval=max_poll_interval,
+        expose_metrics=config.get(CONF_METRICS),
+        poll_columns=POLL_PROFILES[config.get(CONF_POLL_PROFILE)],
+        full_poll_every=config.get(CONF_FULL_POLL_EVERY),
+    )
+
+    # The poll budget is shared by all units; the first platform entry sets it
+    if DATA_GREE_SCHEDULER not in hass.data:
+        scheduler = hass.data[DATA_GREE_SCHEDULER] = GreePollScheduler(hass.loop, config.get(CONF_POLL_BUDGET))
+
+        @callback
+        def async_stop_scheduler(event):
+            # Cancel the poll timers on the event loop they were scheduled on
+            scheduler.async_stop()
+
+        hass.bus.async_listen_once(EVENT_HOMEASSISTANT_STOP, async_stop_scheduler)
+
+    if not hass.services.has_service(DOMAIN, SERVICE_SET_OPTIONS):
+        async def async_handle_set_options(call):
+            await async_set_group_options(hass, call.data)
+        hass.services.async_register(DOMAIN, SERVICE_SET_OPTIONS, async_handle_set_options, schema=SET_OPTIONS_SCHEMA)
+
+    if config.get(CONF_GATEWAY):
+        # One entity per indoor unit behind the gateway; the gateway polls all of them in one burst per cycle
+        gateway_mac = config.get(CONF_MAC).replace(':', '').lower()
+        # Home Assistant retries the setup while the gateway does not answer
+        try:
+            gateway = await async_get_gateway(hass, ip_addr, port, gateway_mac, encryption_key, uid)
+            try:
+                sub_units = await gateway.async_sub_units(config.get(CONF_TIMEOUT))
+            except GreeDecryptError:
+                if gateway.key_is_configured:
+                    raise
+                _LOGGER.warning('Cached key for gateway %s looks stale, binding again', gateway_mac)
+                await async_rebind_gateway(hass, gateway, gateway.key)
+                sub_units = await gateway.async_sub_units(config.get(CONF_TIMEOUT))
+        except (asyncio.TimeoutError, GreeDecryptError, ConnectionError) as ex:
+            raise PlatformNotReady('Gree gateway {} at {} is not responding: {}'.format(gateway_mac, ip_addr, ex)) from ex
+        _LOGGER.info('Gree gateway %s has %d sub-units', gateway_mac, len(sub_units))
+        async_add_devices([
+            GreeClimate(hass, '{} {}'.format(name, sub_mac), ip_addr, port, sub_mac.encode(), gateway=gateway, **options)
+            for sub_mac in sub_units
+        ])
+        hass.data[DATA_GREE_SCHEDULER].async_add(gateway_mac, gateway.async_poll, min_poll_interval, max_poll_interval)
+        return
+
+    if not discovery:
+        mac_addr = config.get(CONF_MAC).encode().replace(b':', b'')
+        async_add_devices([
+            GreeClimate(hass, name, ip_addr, port, mac_addr, encryption_key=encryption_key, **options)
+        ])
+        return
+
+    # Discover every unit on the subnet with one broadcast; the units then bind concurrently in the background
+    devices = await async_discover_devices(hass, config.get(CONF_BROADCAST_ADDRESS), port)
+    _LOGGER.info('Discovered %d Gree units', len(devices))
+    entities = []
+    for mac, ((dev_ip_addr, dev_port), pack) in devices.items():
+        dev_name = '{} {}'.format(name, pack.get('name') or mac)
+        entities.append(GreeClimate(hass, dev_name, dev_ip_addr, dev_port, mac.encode(), **options))
+
+    async_add_devices(entities)
+
+async def async_set_group_options(hass, data):
+    # Send one combined cmd pack to every listed unit concurrently and report the outcome per unit
+    entities = hass.data.get(DATA_GREE_ENTITIES, {})
+    results = {}
+    targets = []
+    for entity_id in data[ATTR_ENTITY_ID]:
+        if entity_id in entities:
+            targets.append(entities[entity_id])
+        else:
+            results[entity_id] = 'unknown Gree entity'
+
+    outcomes = await asyncio.gather(*[entity.async_set_options(data) for entity in targets], return_exceptions=True)
+    for entity, outcome in zip(targets, outcomes):
+        if isinstance(outcome, Exception):
+            _LOGGER.warning('Setting options on %s failed: %s', entity.entity_id, outcome)
+            results[entity.entity_id] = str(outcome) or type(outcome).__name__
+        else:
+            results[entity.entity_id] = 'ok'
+    hass.bus.async_fire(EVENT_SET_OPTIONS_RESULT, {'results': results})
+    return results
+
+async def async_discover_devices(hass, broadcast_address, port):
+    # Broadcast a scan and return {mac: ((ip, port), dev pack)} for every unit that answered
+    transport = await async_get_transport(hass)
+    return await transport.async_scan(broadcast_address, port, SCAN_REQUEST, lambda pack: decode_pack(generic_cipher(), pack))
+
+async def async_get_gateway(hass, ip_addr, port, mac, encryption_key=None, uid=None):
+    # Return a gateway using the configured, cached or freshly bound key of the outdoor unit
+    transport = await async_get_transport(hass)
+    key_store = await async_get_key_store(hass)
+    ip_addr = await transport.async_resolve(ip_addr, port)
+    key = encryption_key or key_store.get(mac)
+    if not key:
+        reply = await transport.async_request(ip_addr, port, mac, bind_request(mac), lambda pack: decode_pack(generic_cipher(), pack), 'bindok')
+        key = reply['key']
+        key_store.async_set(mac, key)
+    return GreeGateway(transport, ip_addr, port, mac, key.encode('utf8'), uid or 0, bool(encryption_key))
+
+async def async_rebind_gateway(hass, gateway, stale_key):
+    # Bind the outdoor unit again, unless a sub-unit already did since stale_key failed, and cache the new key
+    key = await gateway.async_rebind(stale_key)
+    (await async_get_key_store(hass)).async_set(gateway.mac, key.decode('utf8'))
+
+async def async_get_transport(hass):
+    # Return the UDP endpoint shared by all Gree entities, creating it on first use
+    if DATA_GREE_TRANSPORT not in hass.data:
+        hass.data[DATA_GREE_TRANSPORT] = hass.async_create_task(_async_create_transport(hass))
+    return await hass.data[DATA_GREE_TRANSPORT]
+
+async def async_get_key_store(hass):
+    # Return the device key cache, loading it from storage on first use
+    if DATA_GREE_KEYS not in hass.data:
+        hass.data[DATA_GREE_KEYS] = hass.async_create_task(_async_load_key_store(hass))
+    return await hass.data[DATA_GREE_KEYS]
+
+async def _async_load_key_store(hass):
+    key_store = GreeKeyStore(hass)
+    await key_store.async_load()
+    return key_store
+
+async def _async_create_transport(hass):
+    transport = await async_create_endpoint(hass.loop)
+
+    @callback
+    def async_close_transport(event):
+        # Close on the event loop, asyncio transports are not thread-safe
+        transport.close()
+
+    hass.bus.async_listen_once(EVENT_HOMEASSISTANT_STOP, async_close_transport)
+    return transport
 
-class GreeClimate(ClimateDevice):
+class GreeClimate(ClimateDevice, RestoreEntity):
 
-    def __init__(self, hass, name, ip_addr, port, mac_addr, min_temp, max_temp, target_temp, target_temp_step, temp_sensor_entity_id, operation_list, fan_list, swing_updn_mode_list, default_operation, default_fan_mode, default_operation_from_idle, default_swing_updn_mode, encryption_key=None, uid=None):
+    def __init__(self, hass, name, ip_addr, port, mac_addr, *, min_temp, max_temp, target_temp, target_temp_step, temp_sensor_entity_id, operation_list, fan_list, swing_updn_mode_list, default_operation, default_fan_mode, default_operation_from_idle, default_swing_updn_mode, encryption_key=None, uid=None, min_poll_interval=DEFAULT_MIN_POLL_INTERVAL, max_poll_interval=DEFAULT_MAX_POLL_INTERVAL, expose_metrics=False, gateway=None, poll_columns=POLL_PROFILES[PROFILE_MINIMAL], full_poll_every=DEFAULT_FULL_POLL_EVERY):
         # Initialize the Broadlink IR Climate device.
 
         self.hass = hass
@@ -146,23 +332,62 @@ class GreeClimate(ClimateDevice):
 
         self._default_operation_from_idle = default_operation_from_idle
 
+        self._min_poll_interval = min_poll_interval
+        self._max_poll_interval = max_poll_interval
+
+        # Routine polls fetch poll_columns, every full_poll_every-th poll fetches every column
+        self._poll_columns = poll_columns
+        self._full_poll_every = full_poll_every
+        self._pollsSinceFull = 0
+
+        self._metrics = GreeMetrics()
+        self._expose_metrics = expose_metrics
+        self._metricsWrittenAt = 0
+
+        # Sub-units are reached through their gateway with the gateway's key, re-bound through the gateway unless configured
+        self._gateway = gateway
+        if gateway is not None:
+            encryption_key = gateway.key.decode('utf8') if gateway.key_is_configured else None
+        self._tcid_mac = gateway.mac if gateway is not None else self._mac_addr
+        self._resolved_ip = gateway.host if gateway is not None else None
+        self._sub_mac = self._mac_addr if gateway is not None else None
+
+        # Without a configured key the device key is loaded from the cache or fetched in async_added_to_hass
+        self._encryption_key = None
+        self._key_is_configured = bool(encryption_key)
+        self._key_is_unconfirmed = False
         if encryption_key:
-            _LOGGER.info('Using configured encryption key: {}'.format(encryption_key))
+            _LOGGER.debug('Using configured encryption key: %s', encryption_key)
             self._encryption_key = encryption_key.encode("utf8")
-        else:
-            _LOGGER.info('Fetching Device Encryption Key')
-            self._encryption_key = self.GetDeviceKey().encode("utf8")
-            _LOGGER.info('Fetched Device Encryption Key: %s' % self._encryption_key)
+        elif gateway is not None:
+            self._encryption_key = gateway.key
 
-        if uid:
-            self._uid = uid
+        self._uid = uid or 0
         
-        self._acOptions = { 'Pow': None, 'Mod': None, 'SetTem': None, 'WdSpd': None, 'Air': None, 'Blo': None, 'Health': None, 'SwhSlp': None, 'Lig': None, 'SwingLfRig': None, 'SwUpDn': None, 'Quiet': None, 'Tur': None, 'StHt': None, 'TemUn': None, 'HeatCoolType': None, 'TemRec': None, 'SvSt': None }
+        self._acOptions = GreeState()
+
+        # User-visible fields as last written to the state machine
+        self._lastWrittenState = None
+
+        # Unavailable until the first status sync succeeds or a last state is restored
+        self._available = False
 
         self._firstTimeRun = True
 
-        # Cipher to use to encrypt/decrypt
-        self.CIPHER = AES.new(self._encryption_key, AES.MODE_ECB)
+        # Every request to the unit goes through its command actor
+        self._actor = GreeCommandActor(hass.loop)
+
+        # Options waiting to be sent in the next cmd pack, and options sent but not yet acknowledged
+        self._pendingOptions = {}
+        self._inflightOptions = {}
+        self._pendingFlush = None
+
+        # Codec to use to encrypt/decrypt
+        self._codec = None
+        if gateway is not None:
+            self._codec = gateway.sub_codec(self._mac_addr)
+        elif self._encryption_key:
+            self._codec = GreeCodec(self._mac_addr, self._encryption_key, self._uid)
 
         if temp_sensor_entity_id:
             async_track_state_change(
@@ -173,116 +398,82 @@ class GreeClimate(ClimateDevice):
             if sensor_state:
                 self._async_update_current_temp(sensor_state)
 
-    # Pad helper method to help us get the right string for encrypting
-    def Pad(self, s):
-        aesBlockSize = 16
-        return s + (aesBlockSize - len(s) % aesBlockSize) * chr(aesBlockSize - len(s) % aesBlockSize)            
-
-    def FetchResult(self, cipher, ip_addr, port, json):
-        _LOGGER.info('FetchResult(%s, %s, %s)' % (ip_addr, port, json))
-        # Setup UDP Client & start transfering
-        _LOGGER.info('Creating sock')
-        clientSock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-        clientSock.settimeout(3)
-        _LOGGER.info('Sending over UDP')
-        clientSock.sendto(bytes(json, "utf-8"), (ip_addr, port))
-        _LOGGER.info('Receiving over UDP')
-        data, addr = clientSock.recvfrom(64000)
-        _LOGGER.info('Loading received JSON')
-        receivedJson = simplejson.loads(data)
-        _LOGGER.info('Closing socket')
-        clientSock.close()
-
-        pack = receivedJson['pack']
-        _LOGGER.info('Base64-decoding received pack')
-        base64decodedPack = base64.b64decode(pack)
-        _LOGGER.info('Decrypting received pack')
-        decryptedPack = cipher.decrypt(base64decodedPack)
-        _LOGGER.info('Decoding received pack')
-        decodedPack = decryptedPack.decode("utf-8")
-        _LOGGER.info('Removing unneeded chars from received pack')
-        replacedPack = decodedPack.replace('\x0f', '').replace(decodedPack[decodedPack.rindex('}')+1:], '')
-        _LOGGER.info('Loading pack JSON')
-        loadedJsonPack = simplejson.loads(replacedPack)
-        _LOGGER.info('Returning pack JSON')
-        return loadedJsonPack
-
-    def GetDeviceKey(self):
-        _LOGGER.info('GetDeviceKey()')
-        _LOGGER.info('Creating encryptor with Device Key')
-        GENERIC_GREE_DEVICE_KEY = "a3K8Bx%2r8Y7#xDh"
-        cipher = AES.new(GENERIC_GREE_DEVICE_KEY.encode("utf8"), AES.MODE_ECB)
-        _LOGGER.info('Encrypting Pack')
-        pack = base64.b64encode(cipher.encrypt(self.Pad('{"mac":"' + str(self._mac_addr) + '","t":"bind","uid":0}').encode("utf8"))).decode('utf-8')
-        _LOGGER.info('Creating JSON')
-        jsonPayloadToSend = '{"cid": "app","i": 1,"pack": "' + pack + '","t":"pack","tcid":"' + str(self._mac_addr) + '","uid": 0}'
-        _LOGGER.info('Fetching & Returning result')
-        return self.FetchResult(cipher, self._ip_addr, self._port, jsonPayloadToSend)['key']
-
-    def GreeGetValues(self, propertyNames):
-        jsonPayloadToSend = '{"cid":"app","i":0,"pack":"' + base64.b64encode(self.CIPHER.encrypt(self.Pad('{"cols":' + simplejson.dumps(propertyNames) + ',"mac":"' + str(self._mac_addr) + '","t":"status"}').encode("utf8"))).decode('utf-8') + '","t":"pack","tcid":"' + str(self._mac_addr) + '","uid":{}'.format(self._uid) + '}'
-        return self.FetchResult(self.CIPHER, self._ip_addr, self._port, jsonPayloadToSend)['dat']
+    async def FetchResult(self, payload, decode, reply_type):
+        _LOGGER.debug('FetchResult(%s, %s, %s)', self._ip_addr, self._port, payload)
+        # Send over the shared UDP endpoint & wait for the matching reply, retrying lost packets
+        transport = await async_get_transport(self.hass)
+        if self._resolved_ip is None:
+            # Replies are matched by source address, so a configured hostname is resolved once
+            self._resolved_ip = await transport.async_resolve(self._ip_addr, self._port)
+        for attempt in range(DEFAULT_RETRY):
+            if attempt:
+                self._metrics.record_retry()
+            start = self.hass.loop.time()
+            try:
+                loadedJsonPack = await transport.async_request(self._resolved_ip, self._port, self._tcid_mac, payload, decode, reply_type, sub_mac=self._sub_mac)
+            except asyncio.TimeoutError:
+                self._metrics.record_timeout()
+                if attempt == DEFAULT_RETRY - 1:
+                    raise
+                continue
+            except GreeDecryptError:
+                self._metrics.record_decrypt_error()
+                raise
+            self._metrics.record_success(REQUEST_TYPES[reply_type], self.hass.loop.time() - start)
+            return loadedJsonPack
+
+    async def GetDeviceKey(self):
+        _LOGGER.debug('GetDeviceKey()')
+        return (await self.FetchResult(bind_request(self._mac_addr), lambda pack: decode_pack(generic_cipher(), pack), 'bindok'))['key']
+
+    async def FetchDeviceResult(self, build_payload, reply_type):
+        # Request with the device key, re-binding once when the key turns out to be stale
+        try:
+            result = await self.FetchResult(build_payload(self._codec), self._codec.decode_pack, reply_type)
+        except GreeDecryptError:
+            if self._key_is_configured:
+                raise
+        except asyncio.TimeoutError:
+            # Only a cached key that has never worked is suspected on a plain timeout
+            if not self._key_is_unconfirmed:
+                raise
+        else:
+            self._key_is_unconfirmed = False
+            return result
+        _LOGGER.warning('Cached key for %s looks stale, binding again', self._mac_addr)
+        await self.async_bind()
+        return await self.FetchResult(build_payload(self._codec), self._codec.decode_pack, reply_type)
+
+    async def GreeGetValues(self, propertyNames):
+        return (await self.FetchDeviceResult(lambda codec: codec.status_request(propertyNames), 'dat'))['dat']
 
     def SetAcOptions(self, acOptions, newOptionsToOverride, optionValuesValuesToOverride = None):
         if not (optionValuesValuesToOverride is None):
-            _LOGGER.info('Setting script global state with current values')
-            for key in newOptionsToOverride:
-                _LOGGER.info('Setting %s: %s' % (key, optionValuesValuesToOverride[newOptionsToOverride.index(key)]))
-                acOptions[key] = optionValuesValuesToOverride[newOptionsToOverride.index(key)]
-            _LOGGER.info('Done setting script global state with current values')
+            for key, value in zip(newOptionsToOverride, optionValuesValuesToOverride):
+                acOptions[key] = value
         else:
-            _LOGGER.info('Overwriting script global state with given def params')
             for key, value in newOptionsToOverride.items():
-                _LOGGER.info('Setting %s: %s' % (key, value))
                 acOptions[key] = value
-            _LOGGER.info('Done overwriting script global state with given def params')
+        _LOGGER.debug('Set AC options: %s', acOptions)
         return acOptions
         
-    def SendStateToAc(self):
-        _LOGGER.info('Defining statePackJson')
-        #statePackJson = '{' + '"opt":["TemUn","SetTem","TemRec","Pow","SwUpDn","Quiet","Mod","WdSpd"],"p":[{TemUn},{SetTem},{TemRec},{Pow},{SwUpDn},{Quiet},{Mod},{WdSpd}],"t":"cmd"'.format(**self._acOptions) + '}'
-        statePackJson = '{' + '"opt":["Pow","Mod","SetTem","WdSpd","Air","Blo","Health","SwhSlp","Lig","SwingLfRig","SwUpDn","Quiet","Tur","StHt","TemUn","HeatCoolType","TemRec","SvSt"],"p":[{Pow},{Mod}, {SetTem},{WdSpd},{Air},{Blo},{Health},{SwhSlp},{Lig},{SwingLfRig},{SwUpDn},{Quiet},{Tur},{StHt},{TemUn},{HeatCoolType},{TemRec},{SvSt}],"t":"cmd"'.format(**self._acOptions) + '}'
-        _LOGGER.info('statePackJson: ' + statePackJson)
-        _LOGGER.info('str(self._mac_addr): ' + str(self._mac_addr))
-        sentJsonPayload = '{"cid":"app","i":0,"pack":"' + base64.b64encode(self.CIPHER.encrypt(self.Pad(statePackJson).encode("utf8"))).decode('utf-8') + '","t":"pack","tcid":"' + str(self._mac_addr) + '","uid":{}'.format(self._uid) + '}'
-        _LOGGER.info('sentJsonPayload: ' + sentJsonPayload)
-
-        # Setup UDP Client & start transfering
-        _LOGGER.info('Creating socket')
-        clientSock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-        clientSock.settimeout(3)
-        _LOGGER.info('Sending bytes to %s:%s' % (self._ip_addr, self._port))
-        clientSock.sendto(bytes(sentJsonPayload, "utf-8"), (self._ip_addr, self._port))
-        _LOGGER.info('Receiving response')
-        data, addr = clientSock.recvfrom(64000)
-        _LOGGER.info('Loading json')
-        receivedJson = simplejson.loads(data)
-        _LOGGER.info('Closing socket')
-        clientSock.close()
-        _LOGGER.info('Assigning pack json to var')
-        pack = receivedJson['pack']
-        _LOGGER.info('Base64 Decode pack')
-        base64decodedPack = base64.b64decode(pack)
-        _LOGGER.info('AES Decrypt pack')
-        decryptedPack = self.CIPHER.decrypt(base64decodedPack)
-        _LOGGER.info('Decode pack to UTF-8')
-        decodedPack = decryptedPack.decode("utf-8")
-        _LOGGER.info('Replacing unneeded characters in string')
-        replacedPack = decodedPack.replace('\x0f', '').replace(decodedPack[decodedPack.rindex('}')+1:], '')
-        _LOGGER.info('replacedPack: ' + str(replacedPack))
-        _LOGGER.info('Loading pack into JSON')
-        receivedJsonPayload = simplejson.loads(replacedPack)
-        _LOGGER.info('receivedJsonPayload: ' + str(receivedJsonPayload))
+    async def SendStateToAc(self, acOptions):
+        # Send only the changed options
+        optionsToSend = list(acOptions)
+        _LOGGER.debug('Sending options to AC: %s', acOptions)
+        optionValues = [acOptions[key] for key in optionsToSend]
+        receivedJsonPayload = await self.FetchDeviceResult(lambda codec: codec.command_request(optionsToSend, optionValues), 'res')
+        _LOGGER.debug('receivedJsonPayload: %s', receivedJsonPayload)
 
     def UpdateHATargetTemperature(self):
         # Sync set temperature to HA
         self._target_temperature = self._acOptions['SetTem']
-        _LOGGER.info('Set HA State target temp to ' + str(self._acOptions['SetTem']))
+        _LOGGER.debug('Set HA State target temp to %s', self._acOptions['SetTem'])
 
     def UpdateHACurrentOperation(self):
         # Sync current operation mode to HA
         self._current_operation = DEFAULT_OPERATION_LIST[self._acOptions['Mod']]
-        _LOGGER.info('Set HA State current operation to ' + str(self._current_operation))
+        _LOGGER.debug('Set HA State current operation to %s', self._current_operation)
 
     def UpdateHAOnOffState(self):
         # Sync On/Off state to HA
@@ -292,13 +483,12 @@ class GreeClimate(ClimateDevice):
             self._current_state = STATE_OFF
         else:
             self._current_state = STATE_UNKNOWN
-        _LOGGER.info('self._current_state after: ' + str(self._current_state))
-        _LOGGER.info('Set HA State On/Off to ' + str(self._current_state))
+        _LOGGER.debug('Set HA State On/Off to %s', self._current_state)
 
     def UpdateHACurrentSwingMode(self):
         # Sync Current Swing mode state to HA
         self._current_swing_mode = DEFAULT_SWING_UPDN_MODES[self._acOptions['SwUpDn']]
-        _LOGGER.info('Set HA State current_swing_mode to ' + str(self._current_swing_mode))
+        _LOGGER.debug('Set HA State current_swing_mode to %s', self._current_swing_mode)
 
     def UpdateHAFanSpeedMode(self):
         # Sync Fan speed state to HA
@@ -308,7 +498,15 @@ class GreeClimate(ClimateDevice):
             self._current_fan_mode = 'Quiet'
         else:
             self._current_fan_mode = DEFAULT_FAN_MODE_LIST[int(self._acOptions['WdSpd'])]
-        _LOGGER.info('Set HA State current fan mode to ' + str(self._current_fan_mode))
+        _LOGGER.debug('Set HA State current fan mode to %s', self._current_fan_mode)
+
+    def UpdateHACurrentTemperature(self):
+        # Use the unit's own room sensor unless an external sensor is configured
+        if self._temp_sensor_entity_id or not self._acOptions['TemSen']:
+            return
+        self._current_temperature = self.hass.config.units.temperature(
+            int(self._acOptions['TemSen']) - TEMSEN_OFFSET, TEMP_CELSIUS)
+        _LOGGER.debug('Set HA State current temp to %s', self._current_temperature)
 
     def UpdateHAStateToCurrentACState(self):
         self.UpdateHATargetTemperature()
@@ -316,66 +514,100 @@ class GreeClimate(ClimateDevice):
         self.UpdateHAOnOffState()
         self.UpdateHACurrentSwingMode()
         self.UpdateHAFanSpeedMode()
+        self.UpdateHACurrentTemperature()
+
+    async def SendOptionsToAc(self, acOptions):
+        # Trust the cached state instead of reading it back before the write
+        self._acOptions = self.SetAcOptions(self._acOptions, acOptions)
+        self._pendingOptions.update(acOptions)
+
+        # Setter calls within COMMAND_COALESCE_DELAY are merged into one cmd pack
+        if self._pendingFlush is None:
+            self._pendingFlush = self.hass.async_create_task(self._async_flush_options())
+        await asyncio.shield(self._pendingFlush)
+
+        if not (self._firstTimeRun):
+            self.UpdateHAStateToCurrentACState()
 
-    def SyncState(self, acOptions = {}):
+        # Follow the command with fast polls until the unit settles
+        self.hass.data[DATA_GREE_SCHEDULER].async_poke(self._poll_key)
+
+    async def _async_flush_options(self):
+        await asyncio.sleep(COMMAND_COALESCE_DELAY)
+        acOptions, self._pendingOptions = self._pendingOptions, {}
+        self._pendingFlush = None
+        # Status replies arriving before the cmd is acknowledged must not undo these options
+        self._inflightOptions.update(acOptions)
+        try:
+            # The unit may still be binding in the background
+            await self.async_ensure_key()
+            await self._actor.async_submit(PRIORITY_COMMAND, lambda: self.SendStateToAc(acOptions))
+        finally:
+            for key, value in acOptions.items():
+                if self._inflightOptions.get(key) == value:
+                    del self._inflightOptions[key]
+
+    async def SyncState(self):
+        # Concurrent syncs share one status request, queued behind any user command
+        await self._actor.async_status(self._async_sync_state)
+
+    async def _async_sync_state(self):
         #Fetch current settings from AC
-        _LOGGER.info('Starting SyncState')
+        _LOGGER.debug('Starting SyncState')
 
-        optionsToFetch = ["Pow","Mod","SetTem","WdSpd","Air","Blo","Health","SwhSlp","Lig","SwingLfRig","SwUpDn","Quiet","Tur","StHt","TemUn","HeatCoolType","TemRec","SvSt"]
-        _LOGGER.info('optionsToFetch: ' + str(optionsToFetch))
-        currentValues = self.GreeGetValues(optionsToFetch)
-        _LOGGER.info('currentValues: ' + str(currentValues))
+        if self._firstTimeRun or self._pollsSinceFull >= self._full_poll_every:
+            optionsToFetch = POLL_PROFILES[PROFILE_FULL]
+            self._pollsSinceFull = 0
+        else:
+            optionsToFetch = self._poll_columns
+            self._pollsSinceFull += 1
+        _LOGGER.debug('optionsToFetch: %s', optionsToFetch)
+        currentValues = await self.GreeGetValues(optionsToFetch)
+        _LOGGER.debug('currentValues: %s', currentValues)
 
         # Set latest status from device
         self._acOptions = self.SetAcOptions(self._acOptions, optionsToFetch, currentValues)
 
-        # Overwrite status with our choices
-        if not(acOptions == {}):
-            self._acOptions = self.SetAcOptions(self._acOptions, acOptions)
-
-        # Initialize the receivedJsonPayload variable (for return)
-        receivedJsonPayload = ''
+        # Keep options that are still waiting to be sent or acknowledged
+        if self._inflightOptions:
+            self._acOptions = self.SetAcOptions(self._acOptions, self._inflightOptions)
+        if self._pendingOptions:
+            self._acOptions = self.SetAcOptions(self._acOptions, self._pendingOptions)
 
-        # If not the first (boot) run, update state towards the AC
-        if not (self._firstTimeRun):
-            if not(acOptions == {}):
-                self.SendStateToAc()
-        else:
-            self._firstTimeRun = False
+        self._firstTimeRun = False
 
         # Update HA state to current AC state
         self.UpdateHAStateToCurrentACState()
 
-        _LOGGER.info('Finished SyncState')
-        return receivedJsonPayload
+        _LOGGER.debug('Finished SyncState')
 
-    @asyncio.coroutine
+    @callback
     def _async_temp_sensor_changed(self, entity_id, old_state, new_state):
-        _LOGGER.info('_async_temp_sensor_changed() |' + str(entity_id) + '|' + str(old_state) + '|' + str(new_state))
+        _LOGGER.debug('_async_temp_sensor_changed() |%s|%s|%s', entity_id, old_state, new_state)
         # Handle temperature changes.
         if new_state is None:
             return
         self._async_update_current_temp(new_state)
-        yield from self.async_update_ha_state()
+        self._async_write_state_if_changed()
         
     @callback
     def _async_update_current_temp(self, state):
-        _LOGGER.info('_async_update_current_temp() |' + str(state))
+        _LOGGER.debug('_async_update_current_temp() |%s', state)
         # Update thermostat with latest state from sensor.
         unit = state.attributes.get(ATTR_UNIT_OF_MEASUREMENT)
 
         try:
             _state = state.state
-            _LOGGER.info('Current temp state: ' + _state)
+            _LOGGER.debug('Current temp state: %s', _state)
             if self.represents_float(_state):
                 self._current_temperature = self.hass.config.units.temperature(
                     float(_state), unit)
-                _LOGGER.info('Current temp: ' + str(self._current_temperature))
+                _LOGGER.debug('Current temp: %s', self._current_temperature)
         except ValueError as ex:
             _LOGGER.error('Unable to update from sensor: %s', ex)    
 
     def represents_float(self, s):
-        _LOGGER.info('represents_float() |' + str(s))
+        _LOGGER.debug('represents_float() |%s', s)
         try: 
             float(s)
             return True
@@ -388,6 +620,11 @@ class GreeClimate(ClimateDevice):
         # Return the current state.
         return self._current_state
 
+    @property
+    def available(self):
+        # Return True once the unit has answered a status request
+        return self._available
+
     @property
     def is_on(self):
         # Return true if on.
@@ -396,69 +633,90 @@ class GreeClimate(ClimateDevice):
         else:
             return False
 
+    @property
+    def device_state_attributes(self):
+        # Protocol metrics as diagnostic attributes, when enabled
+        if self._expose_metrics:
+            return self._metrics.as_dict()
+        return None
+
     @property
     def should_poll(self):
-        _LOGGER.info('should_poll()')
-        # Return the polling state.
-        return True
+        # Polling is driven by the adaptive GreePollScheduler
+        return False
 
-    def update(self):
-        _LOGGER.info('update()')
+    async def async_update(self):
+        _LOGGER.debug('update()')
         # Update HA State from Device
-        self.SyncState()
-        
+        await self.SyncState()
+
+    async def _async_poll(self):
+        # Scheduled poll, reporting whether an option of the unit changed; room temperature drift is not activity
+        previousOptions = self._acOptions.snapshot()
+        try:
+            await self.async_ensure_key()
+            await self.SyncState()
+        except (asyncio.TimeoutError, GreeDecryptError, ConnectionError):
+            self._available = False
+            self._async_write_state_if_changed()
+            raise
+        self._available = True
+        self._async_write_state_if_changed()
+        return any(column not in SENSOR_COLUMNS for column in self._acOptions.diff(previousOptions))
+
+    @callback
+    def _async_write_state_if_changed(self):
+        # Write to the state machine only when a user-visible field changed, or exposed metrics are due a refresh
+        haState = (self._available, self._current_state, self._target_temperature, self._current_operation, self._current_fan_mode, self._current_swing_mode, self._current_temperature)
+        now = self.hass.loop.time()
+        metricsDue = self._expose_metrics and now - self._metricsWrittenAt >= METRICS_WRITE_INTERVAL
+        if haState != self._lastWrittenState or metricsDue:
+            self._lastWrittenState = haState
+            self._metricsWrittenAt = now
+            self.async_schedule_update_ha_state()
 
     @property
     def name(self):
-        _LOGGER.info('name()')
         # Return the name of the climate device.
         return self._name
 
     @property
     def temperature_unit(self):
-        _LOGGER.info('temperature_unit()')
         # Return the unit of measurement.
         return self._unit_of_measurement
 
     @property
     def current_temperature(self):
-        _LOGGER.info('current_temperature(): ' + str(self._current_temperature))
         # Return the current temperature.
         return self._current_temperature
         
     @property
     def min_temp(self):
-        _LOGGER.info('min_temp()')
         # Return the polling state.
         return self._min_temp
         
     @property
     def max_temp(self):
-        _LOGGER.info('max_temp()')
         # Return the polling state.
         return self._max_temp    
         
     @property
     def target_temperature(self):
-        _LOGGER.info('target_temperature(): ' + str(self._target_temperature))
         # Return the temperature we try to reach.
         return self._target_temperature
         
     @property
     def target_temperature_step(self):
-        _LOGGER.info('target_temperature_step()')
         # Return the supported step of target temperature.
         return self._target_temperature_step
 
     @property
     def current_operation(self):
-        _LOGGER.info('current_operation(): ' + str(self._current_operation))
         # Return current operation ie. heat, cool, idle.
         return self._current_operation
 
     @property
     def current_swing_mode(self):
-        _LOGGER.info('current_swing_mode(): ' + str(self._current_swing_mode))
         # get the current swing mode
         return self._current_swing_mode
 
@@ -469,80 +727,167 @@ class GreeClimate(ClimateDevice):
 
     @property
     def operation_list(self):
-        _LOGGER.info('operation_list()')
         # Return the list of available operation modes.
         return self._operation_list
 
     @property
     def current_fan_mode(self):
-        _LOGGER.info('current_fan_mode()')
         # Return the fan setting.
         return self._current_fan_mode
 
     @property
     def fan_list(self):
-        _LOGGER.info('fan_list()')
         # Return the list of available fan modes.
         return self._fan_list
         
     @property
     def supported_features(self):
-        _LOGGER.info('supported_features()')
         # Return the list of supported features.
         return SUPPORT_FLAGS        
  
-    def set_temperature(self, **kwargs):
-        _LOGGER.info('set_temperature()')
+    async def async_set_temperature(self, **kwargs):
+        _LOGGER.debug('set_temperature()')
         # Set new target temperatures.
-        _LOGGER.info('kwargs.get(ATTR_TEMPERATURE): ' + str(kwargs.get(ATTR_TEMPERATURE)))
+        _LOGGER.debug('kwargs.get(ATTR_TEMPERATURE): %s', kwargs.get(ATTR_TEMPERATURE))
         if kwargs.get(ATTR_TEMPERATURE) is not None:
             if not (self._acOptions['Pow'] == 0):
-                _LOGGER.info('SyncState with SetTem=' + str(kwargs.get(ATTR_TEMPERATURE)))
-                self.SyncState({ 'SetTem': int(kwargs.get(ATTR_TEMPERATURE))})
-                self.schedule_update_ha_state()
+                _LOGGER.debug('Sending SetTem=%s', kwargs.get(ATTR_TEMPERATURE))
+                await self.SendOptionsToAc({ 'SetTem': int(kwargs.get(ATTR_TEMPERATURE))})
+                self._async_write_state_if_changed()
 
-    def set_swing_mode(self, swing_mode):
-        _LOGGER.info('Set swing mode: ' + swing_mode)
+    async def async_set_swing_mode(self, swing_mode):
+        _LOGGER.debug('Set swing mode: %s', swing_mode)
         # set the swing mode
         if not (self._acOptions['Pow'] == 0):
-            _LOGGER.info('SyncState with SwUpDn=' + str(swing_mode))
-            self.SyncState({'SwUpDn': self._swing_updn_mode_list.index(swing_mode)})
-            self.schedule_update_ha_state()
+            _LOGGER.debug('Sending SwUpDn=%s', swing_mode)
+            await self.SendOptionsToAc({'SwUpDn': self._swing_updn_mode_list.index(swing_mode)})
+            self._async_write_state_if_changed()
 
-    def set_fan_mode(self, fan):
-        _LOGGER.info('set_fan_mode() |' + str(fan))
+    async def async_set_fan_mode(self, fan):
+        _LOGGER.debug('set_fan_mode() |%s', fan)
         # Set new target temperature.
 
         if not (self._acOptions['Pow'] == 0):
-
-            if (fan.lower() == 'turbo'):
-                _LOGGER.info('Enabling turbo mode')
-                self.SyncState({'Tur': 1, 'Quiet': 0})
-            elif (fan.lower() == 'quiet'):
-                _LOGGER.info('Enabling quiet mode')
-                self.SyncState({'Tur': 0, 'Quiet': 1})
-            else:
-                _LOGGER.info('Setting normal fan mode to ' + str(self._fan_list.index(fan)))
-                self.SyncState({'WdSpd': str(self._fan_list.index(fan)), 'Tur': 0, 'Quiet': 0})
-            self.schedule_update_ha_state()
-
-    def turn_on(self):
+            await self.SendOptionsToAc(self.FanModeOptions(fan))
+            self._async_write_state_if_changed()
+
+    def FanModeOptions(self, fan):
+        if (fan.lower() == 'turbo'):
+            _LOGGER.debug('Enabling turbo mode')
+            return {'Tur': 1, 'Quiet': 0}
+        elif (fan.lower() == 'quiet'):
+            _LOGGER.debug('Enabling quiet mode')
+            return {'Tur': 0, 'Quiet': 1}
+        _LOGGER.debug('Setting normal fan mode to %s', self._fan_list.index(fan))
+        return {'WdSpd': self._fan_list.index(fan), 'Tur': 0, 'Quiet': 0}
+
+    async def async_set_options(self, data):
+        # Apply several settings from the set_options service in one cmd pack
+        acOptions = {}
+        if data.get(ATTR_POWER) is not None:
+            acOptions['Pow'] = int(data[ATTR_POWER])
+        if data.get(ATTR_OPERATION_MODE) is not None:
+            acOptions['Mod'] = self._operation_list.index(data[ATTR_OPERATION_MODE])
+        if data.get(ATTR_TEMPERATURE) is not None:
+            acOptions['SetTem'] = int(data[ATTR_TEMPERATURE])
+        if data.get(ATTR_FAN_MODE) is not None:
+            acOptions.update(self.FanModeOptions(data[ATTR_FAN_MODE]))
+        if data.get(ATTR_SWING_MODE) is not None:
+            acOptions['SwUpDn'] = self._swing_updn_mode_list.index(data[ATTR_SWING_MODE])
+        if acOptions:
+            await self.SendOptionsToAc(acOptions)
+            self._async_write_state_if_changed()
+
+    async def async_turn_on(self):
         # Turn device on.
-        self.SyncState({'Pow': 1})
-        self.schedule_update_ha_state()
+        await self.SendOptionsToAc({'Pow': 1})
+        self._async_write_state_if_changed()
 
-    def turn_off(self):
+    async def async_turn_off(self):
         # Turn device off.
-        self.SyncState({'Pow': 0})
-        self.schedule_update_ha_state()
+        await self.SendOptionsToAc({'Pow': 0})
+        self._async_write_state_if_changed()
 
-    def set_operation_mode(self, operation_mode):
-        _LOGGER.info('set_operation_mode() |' + str(operation_mode))
+    async def async_set_operation_mode(self, operation_mode):
+        _LOGGER.debug('set_operation_mode() |%s', operation_mode)
         # Set new target temperature.
-        self.SyncState({'Mod': self._operation_list.index(operation_mode)})
-        self.schedule_update_ha_state()
-        
-    @asyncio.coroutine
-    def async_added_to_hass(self):
-        _LOGGER.info('async_added_to_hass()')
-        self.SyncState()
+        await self.SendOptionsToAc({'Mod': self._operation_list.index(operation_mode)})
+        self._async_write_state_if_changed()
+
+    async def async_added_to_hass(self):
+        _LOGGER.debug('async_added_to_hass()')
+        await super().async_added_to_hass()
+        self.hass.data.setdefault(DATA_GREE_ENTITIES, {})[self.entity_id] = self
+
+        # Show the last known state straight away, the unit is synced in the background
+        lastState = await self.async_get_last_state()
+        if lastState is not None:
+            self.RestoreHAState(lastState)
+        self.hass.async_create_task(self._async_start())
+
+    def RestoreHAState(self, lastState):
+        if lastState.state in (STATE_ON, STATE_OFF):
+            self._current_state = lastState.state
+            # Show the restored state until a background sync actually fails
+            self._available = True
+        attributes = lastState.attributes
+        if attributes.get(ATTR_TEMPERATURE) is not None:
+            self._target_temperature = attributes[ATTR_TEMPERATURE]
+        if attributes.get(ATTR_CURRENT_TEMPERATURE) is not None and not self._temp_sensor_entity_id:
+            self._current_temperature = attributes[ATTR_CURRENT_TEMPERATURE]
+        self._current_operation = attributes.get(ATTR_OPERATION_MODE, self._current_operation)
+        self._current_fan_mode = attributes.get(ATTR_FAN_MODE, self._current_fan_mode)
+        self._current_swing_mode = attributes.get(ATTR_SWING_MODE, self._current_swing_mode)
+        _LOGGER.debug('Restored HA state %s for %s', lastState.state, self._name)
+
+    @property
+    def _poll_key(self):
+        # Sub-units are scheduled as part of their gateway
+        return self._gateway.mac if self._gateway is not None else self.entity_id
+
+    async def _async_start(self):
+        # Bind and fetch the first status, then hand the unit to the poll scheduler
+        try:
+            await self._async_poll()
+        except (asyncio.TimeoutError, GreeDecryptError, ConnectionError) as ex:
+            _LOGGER.warning('Gree unit %s at %s is not responding: %s', self._mac_addr, self._ip_addr, ex)
+        if self._gateway is not None:
+            self._gateway.async_add(self.entity_id, self._async_poll)
+        else:
+            self.hass.data[DATA_GREE_SCHEDULER].async_add(self.entity_id, self._async_poll, self._min_poll_interval, self._max_poll_interval)
+
+    async def async_will_remove_from_hass(self):
+        self.hass.data[DATA_GREE_ENTITIES].pop(self.entity_id, None)
+        if self._gateway is not None:
+            self._gateway.async_remove(self.entity_id)
+        else:
+            self.hass.data[DATA_GREE_SCHEDULER].async_remove(self.entity_id)
+        self._actor.async_stop()
+
+    async def async_ensure_key(self):
+        # Use the configured or cached device key, binding only when there is neither
+        if self._encryption_key is not None:
+            return
+        cachedKey = (await async_get_key_store(self.hass)).get(self._mac_addr)
+        if cachedKey:
+            _LOGGER.debug('Using cached Device Encryption Key')
+            self._encryption_key = cachedKey.encode("utf8")
+            self._key_is_unconfirmed = True
+            self._codec = GreeCodec(self._mac_addr, self._encryption_key, self._uid)
+        else:
+            await self.async_bind()
+
+    async def async_bind(self):
+        if self._gateway is not None:
+            # Sub-units use the outdoor unit's key, so the gateway is bound instead
+            await async_rebind_gateway(self.hass, self._gateway, self._encryption_key)
+            self._encryption_key = self._gateway.key
+            self._codec = self._gateway.sub_codec(self._mac_addr)
+            return
+        _LOGGER.debug('Fetching Device Encryption Key')
+        key = await self.GetDeviceKey()
+        self._encryption_key = key.encode("utf8")
+        self._key_is_unconfirmed = False
+        _LOGGER.debug('Fetched Device Encryption Key: %s', self._encryption_key)
+        self._codec = GreeCodec(self._mac_addr, self._encryption_key, self._uid)
+        (await async_get_key_store(self.hass)).async_set(self._mac_addr, key)
@@ -0,0 +1,83 @@
+"""
+Gateway of a Gree multi-split (VRF) system.
+
+The indoor units of a multi-split system sit behind the outdoor unit's MAC
+and share its device key. The gateway lists its sub-units and polls all of
+them in one concurrent burst per cycle, so the poll scheduler spends one slot
+on the whole system instead of one per indoor unit. A key that was not
+configured can be replaced by binding the outdoor unit again.
+"""
+
+import asyncio
+import logging
+
+from .codec import GreeCodec, bind_request, decode_pack, generic_cipher
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class GreeGateway:
+    """Outdoor unit addressing its indoor units by sub MAC."""
+
+    def __init__(self, transport, host, port, mac, key, uid=0,
+                 key_is_configured=False):
+        self.transport = transport
+        self.host = host
+        self.port = port
+        self.mac = mac
+        self.key = key
+        self.uid = uid
+        self.key_is_configured = key_is_configured
+        self._codec = GreeCodec(mac, key, uid)
+        self._bind_lock = asyncio.Lock()
+        self._polls = {}
+
+    def sub_codec(self, sub_mac):
+        """Return a codec addressing sub_mac through this gateway."""
+        return GreeCodec(sub_mac, self.key, self.uid, gateway_mac=self.mac)
+
+    async def async_sub_units(self, timeout):
+        """Return the MACs of the indoor units behind the gateway."""
+        reply = await self.transport.async_request(
+            self.host, self.port, self.mac, self._codec.sub_list_request(),
+            self._codec.decode_pack, 'subList', timeout)
+        return [entry['mac'].lower() for entry in reply.get('list', [])
+                if entry.get('mac')]
+
+    async def async_rebind(self, stale_key):
+        """Bind the outdoor unit again and return its key as bytes.
+
+        Sub-units failing with the same stale_key share one bind.
+        """
+        async with self._bind_lock:
+            if self.key == stale_key:
+                reply = await self.transport.async_request(
+                    self.host, self.port, self.mac, bind_request(self.mac),
+                    lambda pack: decode_pack(generic_cipher(), pack), 'bindok')
+                self.key = reply['key'].encode('utf8')
+                self._codec = GreeCodec(self.mac, self.key, self.uid)
+        return self.key
+
+    def async_add(self, key, poll):
+        """Poll the sub-unit with the coroutine function poll each cycle."""
+        self._polls[key] = poll
+
+    def async_remove(self, key):
+        """Stop polling the sub-unit registered under key."""
+        self._polls.pop(key, None)
+
+    async def async_poll(self):
+        """Poll every sub-unit concurrently, returning whether any changed."""
+        if not self._polls:
+            return False
+        keys = list(self._polls)
+        results = await asyncio.gather(
+            *[self._polls[key]() for key in keys], return_exceptions=True)
+        changed = False
+        for key, result in zip(keys, results):
+            if isinstance(result, Exception):
+                _LOGGER.debug('Polling %s through gateway %s failed: %s',
+                              key, self.mac, result)
+            elif result:
+                changed = True
+        return changed
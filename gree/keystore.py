@@ -0,0 +1,38 @@
+"""
+Persistent cache of the device keys Gree units hand out on bind.
+
+Keys are kept in Home Assistant's storage keyed by MAC so a restart can talk
+to every known unit straight away instead of repeating the bind handshake.
+"""
+
+from homeassistant.helpers.storage import Store
+
+STORAGE_KEY = 'gree_device_keys'
+STORAGE_VERSION = 1
+SAVE_DELAY = 10
+
+
+class GreeKeyStore:
+    """Device keys by MAC, loaded once and saved lazily."""
+
+    def __init__(self, hass):
+        self._store = Store(hass, STORAGE_VERSION, STORAGE_KEY)
+        self._keys = {}
+
+    async def async_load(self):
+        """Load the stored keys."""
+        data = await self._store.async_load()
+        if data:
+            self._keys = data
+
+    def get(self, mac):
+        """Return the cached key for mac, or None."""
+        return self._keys.get(mac)
+
+    def async_set(self, mac, key):
+        """Cache the key for mac and schedule a save."""
+        if self._keys.get(mac) == key:
+            return
+        self._keys[mac] = key
+        self._store.async_delay_save(lambda: self._keys, SAVE_DELAY)
+
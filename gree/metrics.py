@@ -0,0 +1,105 @@
+"""
+Protocol metrics for Gree units.
+
+Counters and round-trip histograms are cheap to update on every request and
+are rendered into a plain dict only when somebody asks for them.
+"""
+
+import time
+
+# Upper bounds of the round-trip histogram buckets in milliseconds
+RTT_BUCKETS_MS = (10, 25, 50, 100, 250, 500, 1000, 2500)
+
+
+class LatencyHistogram:
+    """Fixed-bucket histogram of round-trip times."""
+
+    __slots__ = ('counts', 'count', 'total', 'maximum')
+
+    def __init__(self):
+        self.counts = [0] * (len(RTT_BUCKETS_MS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.maximum = 0.0
+
+    def add(self, seconds):
+        """Record one round trip."""
+        millis = seconds * 1000
+        for index, bound in enumerate(RTT_BUCKETS_MS):
+            if millis <= bound:
+                break
+        else:
+            index = len(RTT_BUCKETS_MS)
+        self.counts[index] += 1
+        self.count += 1
+        self.total += millis
+        if millis > self.maximum:
+            self.maximum = millis
+
+    def as_dict(self):
+        """Return count, mean, max and bucket counts."""
+        buckets = {'le_%d' % bound: count
+                   for bound, count in zip(RTT_BUCKETS_MS, self.counts)}
+        buckets['le_inf'] = self.counts[-1]
+        return {
+            'count': self.count,
+            'mean_ms': round(self.total / self.count, 1) if self.count else None,
+            'max_ms': round(self.maximum, 1),
+            'buckets': buckets,
+        }
+
+
+class GreeMetrics:
+    """Request counters and latencies of one unit."""
+
+    def __init__(self):
+        self.rtt = {}
+        self.timeouts = 0
+        self.retries = 0
+        self.decrypt_errors = 0
+        self._minute = int(time.monotonic() // 60)
+        self._packets_this_minute = 0
+        self._packets_last_minute = 0
+
+    def _count_packets(self, packets):
+        minute = int(time.monotonic() // 60)
+        if minute != self._minute:
+            self._packets_last_minute = (
+                self._packets_this_minute if minute == self._minute + 1 else 0)
+            self._packets_this_minute = 0
+            self._minute = minute
+        self._packets_this_minute += packets
+
+    def record_success(self, request_type, seconds):
+        """Record a request and its reply."""
+        histogram = self.rtt.get(request_type)
+        if histogram is None:
+            histogram = self.rtt[request_type] = LatencyHistogram()
+        histogram.add(seconds)
+        self._count_packets(2)
+
+    def record_timeout(self):
+        """Record a request that got no reply."""
+        self.timeouts += 1
+        self._count_packets(1)
+
+    def record_retry(self):
+        """Record a request being sent again."""
+        self.retries += 1
+
+    def record_decrypt_error(self):
+        """Record a reply that could not be decrypted or parsed."""
+        self.decrypt_errors += 1
+        self._count_packets(2)
+
+    def as_dict(self):
+        """Return all metrics as state attributes."""
+        self._count_packets(0)
+        return {
+            'rtt': {name: histogram.as_dict()
+                    for name, histogram in self.rtt.items()},
+            'timeouts': self.timeouts,
+            'retries': self.retries,
+            'decrypt_errors': self.decrypt_errors,
+            'packets_per_minute': self._packets_last_minute,
+        }
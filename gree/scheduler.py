@@ -0,0 +1,117 @@
+"""
+Adaptive polling scheduler for Gree units.
+
+Each unit is polled quickly after a command and backs off exponentially while
+its state stays the same. Poll times are jittered so a large fleet does not
+poll in lockstep, and all polls share a budget of polls per minute enforced
+by a token bucket when each poll comes due.
+"""
+
+import logging
+import random
+
+_LOGGER = logging.getLogger(__name__)
+
+DEFAULT_POLL_BUDGET = 120
+JITTER = 0.2
+# Polls allowed back to back, in seconds' worth of budget
+BURST_SECONDS = 5
+
+
+class _Unit:
+    """Polling state of one unit."""
+
+    __slots__ = ('poll', 'min_interval', 'max_interval', 'interval',
+                 'handle', 'task')
+
+    def __init__(self, poll, min_interval, max_interval):
+        self.poll = poll
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.interval = min_interval
+        self.handle = None
+        self.task = None
+
+
+class GreePollScheduler:
+    """Schedules status polls for all registered units.
+
+    ``poll`` is a coroutine function returning True when the unit's state
+    changed, which resets its interval to the minimum; otherwise the interval
+    doubles up to the maximum.
+    """
+
+    def __init__(self, loop, budget=DEFAULT_POLL_BUDGET):
+        self._loop = loop
+        self._rate = budget / 60
+        self._capacity = max(1.0, self._rate * BURST_SECONDS)
+        self._tokens = self._capacity
+        self._refilled = loop.time()
+        self._units = {}
+
+    def async_add(self, key, poll, min_interval, max_interval):
+        """Start polling a unit, first poll at a random point of its interval."""
+        self.async_remove(key)
+        unit = self._units[key] = _Unit(poll, min_interval, max_interval)
+        self._schedule(key, unit, random.uniform(0, min_interval))
+
+    def async_remove(self, key):
+        """Stop polling a unit."""
+        unit = self._units.pop(key, None)
+        if unit is not None and unit.handle is not None:
+            unit.handle.cancel()
+
+    def async_poke(self, key):
+        """Poll a unit at its fastest rate again, e.g. after a command."""
+        unit = self._units.get(key)
+        if unit is None:
+            return
+        unit.interval = unit.min_interval
+        if unit.task is None:
+            unit.handle.cancel()
+            self._schedule(key, unit, unit.min_interval)
+
+    def async_stop(self):
+        """Stop polling every unit."""
+        for key in list(self._units):
+            self.async_remove(key)
+
+    def _schedule(self, key, unit, delay):
+        unit.handle = self._loop.call_later(delay, self._run, key, unit)
+
+    def _take_token(self):
+        # Return how long a poll coming due now has to wait for the budget;
+        # a negative balance reserves tokens for polls already waiting
+        now = self._loop.time()
+        self._tokens = min(self._capacity,
+                           self._tokens + (now - self._refilled) * self._rate)
+        self._refilled = now
+        self._tokens -= 1
+        return 0 if self._tokens >= 0 else -self._tokens / self._rate
+
+    def _run(self, key, unit):
+        wait = self._take_token()
+        if wait:
+            unit.handle = self._loop.call_later(wait, self._start, key, unit)
+        else:
+            self._start(key, unit)
+
+    def _start(self, key, unit):
+        unit.handle = None
+        unit.task = self._loop.create_task(self._async_poll(key, unit))
+
+    async def _async_poll(self, key, unit):
+        try:
+            changed = await unit.poll()
+        except Exception:  # pylint: disable=broad-except
+            _LOGGER.debug('Poll of %s failed', key, exc_info=True)
+            changed = False
+        finally:
+            unit.task = None
+        if self._units.get(key) is not unit:
+            return
+        if changed:
+            unit.interval = unit.min_interval
+        else:
+            unit.interval = min(unit.interval * 2, unit.max_interval)
+        self._schedule(key, unit, unit.interval * random.uniform(1 - JITTER, 1 + JITTER))
@@ -0,0 +1,56 @@
+"""
+Fixed-layout record of a Gree unit's options.
+
+The options are stored in one list indexed by column, so taking a snapshot is
+a tuple copy and comparing two snapshots is a tuple comparison.
+"""
+
+COLUMNS = ("Pow", "Mod", "SetTem", "WdSpd", "Air", "Blo", "Health", "SwhSlp",
+           "Lig", "SwingLfRig", "SwUpDn", "Quiet", "Tur", "StHt", "TemUn",
+           "HeatCoolType", "TemRec", "SvSt", "TemSen")
+COLUMN_INDEX = {column: index for index, column in enumerate(COLUMNS)}
+
+# Columns fetched by a poll: the minimal profile holds what the climate entity
+# shows, the full profile every column
+PROFILE_MINIMAL = 'minimal'
+PROFILE_FULL = 'full'
+POLL_PROFILES = {
+    PROFILE_MINIMAL: ("Pow", "Mod", "SetTem", "WdSpd", "SwUpDn", "Quiet",
+                      "Tur", "TemSen"),
+    PROFILE_FULL: COLUMNS,
+}
+
+# TemSen reports the room temperature in degrees Celsius plus this offset
+TEMSEN_OFFSET = 40
+
+# Columns the unit measures rather than options set on it; a change in these
+# alone is not activity that should speed up polling
+SENSOR_COLUMNS = ("TemSen",)
+
+
+class GreeState:
+    """Options of one unit, addressed by column name."""
+
+    __slots__ = ('_values',)
+
+    def __init__(self):
+        self._values = [None] * len(COLUMNS)
+
+    def __getitem__(self, column):
+        return self._values[COLUMN_INDEX[column]]
+
+    def __setitem__(self, column, value):
+        self._values[COLUMN_INDEX[column]] = value
+
+    def __repr__(self):
+        return 'GreeState(%s)' % ', '.join(
+            '%s=%s' % item for item in zip(COLUMNS, self._values))
+
+    def snapshot(self):
+        """Return the current values as a tuple."""
+        return tuple(self._values)
+
+    def diff(self, snapshot):
+        """Return the columns whose value differs from snapshot."""
+        return [COLUMNS[index] for index, (old, new)
+                in enumerate(zip(snapshot, self._values)) if old != new]
@@ -0,0 +1,212 @@
+"""
+Shared asyncio UDP endpoint for Gree units.
+
+Every Gree entity sends its packets through one DatagramProtocol instead of
+opening a blocking socket per request. Replies are matched to the waiting
+request by source address, MAC (the envelope ``cid``) and the packet type of
+the decrypted pack, so requests to many units can be in flight at once. The
+same endpoint sends the broadcast ``scan`` used for discovery.
+"""
+
+import asyncio
+import logging
+import socket
+
+from .codec import json_loads
+
+_LOGGER = logging.getLogger(__name__)
+
+DEFAULT_REQUEST_TIMEOUT = 3
+DEFAULT_SCAN_TIMEOUT = 3
+
+
+class GreeDecryptError(ValueError):
+    """A unit answered with a pack that could not be decrypted."""
+
+
+class _Waiter:
+    """A request waiting for its reply."""
+
+    __slots__ = ('mac', 'sub_mac', 'reply_type', 'decode', 'future')
+
+    def __init__(self, mac, sub_mac, reply_type, decode, future):
+        self.mac = mac
+        self.sub_mac = sub_mac
+        self.reply_type = reply_type
+        self.decode = decode
+        self.future = future
+
+
+class _Scan:
+    """A broadcast scan collecting ``dev`` replies."""
+
+    __slots__ = ('decode', 'devices')
+
+    def __init__(self, decode):
+        self.decode = decode
+        self.devices = {}
+
+    def offer(self, addr, envelope):
+        """Record a ``dev`` reply, returning whether envelope was one."""
+        try:
+            pack = self.decode(envelope['pack'])
+        except (KeyError, ValueError, UnicodeDecodeError):
+            return False
+        if pack.get('t') != 'dev':
+            return False
+        mac = (pack.get('mac') or envelope.get('cid') or '').lower()
+        if mac:
+            self.devices[mac] = (addr, pack)
+        return True
+
+
+class GreeProtocol(asyncio.DatagramProtocol):
+    """UDP endpoint shared by all Gree units."""
+
+    def __init__(self, loop):
+        self._loop = loop
+        self._transport = None
+        self._waiters = {}
+        self._scans = []
+
+    def connection_made(self, transport):
+        self._transport = transport
+
+    def connection_lost(self, exc):
+        self._transport = None
+        for waiters in self._waiters.values():
+            for waiter in waiters:
+                if not waiter.future.done():
+                    waiter.future.set_exception(
+                        ConnectionError('Gree UDP endpoint closed'))
+        self._waiters = {}
+
+    def error_received(self, exc):
+        _LOGGER.warning('Gree UDP endpoint error: %s', exc)
+
+    def datagram_received(self, data, addr):
+        waiters = self._waiters.get(addr[0])
+        if not waiters and not self._scans:
+            _LOGGER.debug('Ignoring unsolicited datagram from %s', addr[0])
+            return
+        try:
+            envelope = json_loads(data)
+        except ValueError:
+            _LOGGER.debug('Ignoring malformed datagram from %s', addr[0])
+            return
+        undecodable = []
+        if waiters and self._resolve(waiters, envelope, undecodable):
+            return
+        # A scan reply is encrypted with the generic key, not the device key
+        scanned = False
+        for scan in self._scans:
+            scanned = scan.offer(addr, envelope) or scanned
+        if undecodable and not scanned:
+            self._fail(undecodable, envelope)
+
+    @staticmethod
+    def _resolve(waiters, envelope, undecodable):
+        mac = envelope.get('cid')
+        if mac:
+            mac = mac.lower()
+        for waiter in waiters:
+            if waiter.future.done() or (mac and waiter.mac != mac):
+                continue
+            try:
+                pack = waiter.decode(envelope['pack'])
+            except (KeyError, ValueError, UnicodeDecodeError) as exc:
+                undecodable.append((waiter, exc))
+                continue
+            if pack.get('t') != waiter.reply_type:
+                continue
+            if waiter.sub_mac and pack.get('mac', '').lower() != waiter.sub_mac:
+                continue
+            waiter.future.set_result(pack)
+            return True
+        return False
+
+    @staticmethod
+    def _fail(undecodable, envelope):
+        mac = envelope.get('cid')
+        if not mac:
+            return
+        # The unit itself answered and none of our keys fit its reply
+        for waiter, exc in undecodable:
+            if not waiter.future.done():
+                waiter.future.set_exception(GreeDecryptError(
+                    'Unable to decode reply from {}: {}'.format(
+                        mac.lower(), exc)))
+
+    def close(self):
+        """Close the endpoint, failing every pending request."""
+        if self._transport is not None:
+            self._transport.close()
+
+    async def async_resolve(self, host, port):
+        """Return the IPv4 address of host without blocking the loop.
+
+        Replies are matched by source address, so requests must be sent to
+        the address rather than a hostname. Raises ConnectionError when host
+        cannot be resolved.
+        """
+        try:
+            infos = await self._loop.getaddrinfo(
+                host, port, family=socket.AF_INET, type=socket.SOCK_DGRAM)
+        except OSError as exc:
+            raise ConnectionError(
+                'Unable to resolve {}: {}'.format(host, exc)) from exc
+        return infos[0][4][0]
+
+    async def async_request(self, host, port, mac, payload, decode,
+                            reply_type, timeout=DEFAULT_REQUEST_TIMEOUT,
+                            sub_mac=None):
+        """Send payload to a unit and return its decoded reply pack.
+
+        ``host`` must be an IP address, see async_resolve. ``decode`` turns
+        the base64 ``pack`` of a candidate reply into a dict;
+        the first reply from ``host`` for ``mac`` whose pack type equals
+        ``reply_type`` completes the request. For a sub-unit behind a gateway,
+        ``mac`` is the gateway and ``sub_mac`` must match the ``mac`` inside
+        the reply pack. Raises asyncio.TimeoutError when no matching reply
+        arrives in time and GreeDecryptError when the unit answers with a pack
+        that cannot be decoded.
+        """
+        if self._transport is None:
+            raise ConnectionError('Gree UDP endpoint is not connected')
+        waiter = _Waiter(mac, sub_mac, reply_type, decode,
+                         self._loop.create_future())
+        waiters = self._waiters.setdefault(host, [])
+        waiters.append(waiter)
+        try:
+            self._transport.sendto(payload, (host, port))
+            return await asyncio.wait_for(waiter.future, timeout)
+        finally:
+            waiters.remove(waiter)
+            if not waiters and self._waiters.get(host) is waiters:
+                del self._waiters[host]
+
+    async def async_scan(self, address, port, payload, decode,
+                         timeout=DEFAULT_SCAN_TIMEOUT):
+        """Broadcast a scan packet and collect replies for ``timeout`` seconds.
+
+        Returns a dict mapping each responding unit's MAC to a tuple of its
+        ``(host, port)`` address and decoded ``dev`` pack.
+        """
+        if self._transport is None:
+            raise ConnectionError('Gree UDP endpoint is not connected')
+        scan = _Scan(decode)
+        self._scans.append(scan)
+        try:
+            self._transport.sendto(payload, (address, port))
+            await asyncio.sleep(timeout)
+        finally:
+            self._scans.remove(scan)
+        return scan.devices
+
+
+async def async_create_endpoint(loop):
+    """Bind the shared UDP endpoint on an ephemeral port."""
+    _, protocol = await loop.create_datagram_endpoint(
+        lambda: GreeProtocol(loop), local_addr=('0.0.0.0', 0),
+        allow_broadcast=True)
+    return protocol
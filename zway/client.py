@@ -0,0 +1,133 @@
+"""
+Async HTTP client for a Z-Way controller.
+
+All entities on one controller share a single aiohttp session, so requests
+reuse keep-alive connections from one pool, and a semaphore caps how many
+requests are in flight against the controller at once. With credentials the
+client logs in once, sends the ZWAYSession token with every request and
+only logs in again when the controller answers 401.
+"""
+
+import asyncio
+
+import aiohttp
+
+DEFAULT_TIMEOUT = 10
+DEFAULT_MAX_CONNECTIONS = 4
+DEFAULT_HEARTBEAT = 30
+
+LOGIN_PATH = '/ZAutomation/api/v1/login'
+DEVICES_PATH = '/ZAutomation/api/v1/devices'
+DATA_PATH = '/ZWaveAPI/Data/'
+RUN_PATH = '/ZWaveAPI/Run/'
+WEBSOCKET_PATH = '/'
+SESSION_HEADER = 'ZWAYSession'
+
+
+def thermostat_device_id(node):
+    """Return the ZAutomation id of a node's thermostat setpoint device."""
+    return 'ZWayVDev_zway_{}-0-67-1'.format(node)
+
+
+def battery_device_id(node):
+    """Return the ZAutomation id of a node's battery device."""
+    return 'ZWayVDev_zway_{}-0-128'.format(node)
+
+
+class ZwayClient:
+    """Pooled HTTP connection to one Z-Way controller."""
+
+    def __init__(self, host, max_connections=DEFAULT_MAX_CONNECTIONS,
+                 timeout=DEFAULT_TIMEOUT, login=None, password=None):
+        """Initialize the client, the session is opened on first use."""
+        self.host = host.rstrip('/')
+        self._max_connections = max_connections
+        self._timeout = aiohttp.ClientTimeout(total=timeout)
+        self._semaphore = asyncio.Semaphore(max_connections)
+        self._session = None
+        self._login = login
+        self._password = password
+        self._login_lock = asyncio.Lock()
+        self._token = None
+
+    def _get_session(self):
+        if self._session is None or self._session.closed:
+            # The token is sent as a header, a second copy in a cookie could go stale
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(
+                    limit_per_host=self._max_connections),
+                timeout=self._timeout,
+                cookie_jar=aiohttp.DummyCookieJar())
+        return self._session
+
+    def _headers(self):
+        if self._token is None:
+            return None
+        return {SESSION_HEADER: self._token}
+
+    async def async_login(self, stale_token=None):
+        """Log in and keep the session token for later requests.
+
+        Requests failing with the same stale_token share one login.
+        """
+        async with self._login_lock:
+            if self._token is not None and self._token != stale_token:
+                return
+            async with self._semaphore:
+                async with self._get_session().post(
+                        self.host + LOGIN_PATH,
+                        json={'login': self._login,
+                              'password': self._password}) as response:
+                    response.raise_for_status()
+                    body = await response.json(content_type=None)
+            self._token = body['data']['sid']
+
+    async def async_request(self, path, params=None):
+        """GET path on the controller and return the decoded JSON body."""
+        if self._login is not None and self._token is None:
+            await self.async_login()
+        for attempt in range(2):
+            token = self._token
+            async with self._semaphore:
+                async with self._get_session().get(
+                        self.host + path, params=params,
+                        headers=self._headers()) as response:
+                    if (response.status != 401 or self._login is None
+                            or attempt):
+                        response.raise_for_status()
+                        return await response.json(content_type=None)
+            # The token expired or the controller restarted
+            await self.async_login(token)
+
+    async def async_get_device(self, device_id):
+        """Return the ZAutomation data of one virtual device."""
+        body = await self.async_request(DEVICES_PATH + '/' + device_id)
+        return body['data']
+
+    async def async_command(self, device_id, command, **params):
+        """Run a command on one virtual device."""
+        return await self.async_request(
+            DEVICES_PATH + '/' + device_id + '/command/' + command, params)
+
+    async def async_ws_connect(self, heartbeat=DEFAULT_HEARTBEAT):
+        """Open the controller's websocket event feed."""
+        if self._login is not None and self._token is None:
+            await self.async_login()
+        token = self._token
+        try:
+            return await self._get_session().ws_connect(
+                self.host + WEBSOCKET_PATH, heartbeat=heartbeat,
+                headers=self._headers())
+        except aiohttp.WSServerHandshakeError as ex:
+            if ex.status != 401 or self._login is None:
+                raise
+        await self.async_login(token)
+        return await self._get_session().ws_connect(
+            self.host + WEBSOCKET_PATH, heartbeat=heartbeat,
+            headers=self._headers())
+
+    async def async_close(self):
+        """Close the session and its pooled connections."""
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
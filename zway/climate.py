@@ -27,12 +27,21 @@ climate:
     password: admin
     scan_interval: 10
     node: 4
+
+or every thermostat of the controller at once
+
+climate:
+  - platform: zway
+    name: valve
+    host: IP_ADDRESS
+    discovery: true
 """
 
 import logging
 import json
+from datetime import timedelta
 import asyncio
-import requests
+import aiohttp
 import voluptuous as vol
 
 from homeassistant.core import callback
@@ -44,13 +53,24 @@ from homeassistant.components.climate.const import (
     SUPPORT_TARGET_TEMPERATURE)
 from homeassistant.const import (
     ATTR_UNIT_OF_MEASUREMENT, STATE_ON, STATE_OFF, STATE_UNKNOWN, ATTR_TEMPERATURE, CONF_NAME, ATTR_ENTITY_ID,
-    CONF_HOST, PRECISION_HALVES)
+    CONF_HOST, CONF_SCAN_INTERVAL, PRECISION_HALVES, EVENT_HOMEASSISTANT_STOP)
 from homeassistant.helpers import condition
 from homeassistant.helpers.event import (
     async_track_state_change, async_track_time_interval)
 import homeassistant.helpers.config_validation as cv
 from homeassistant.helpers.restore_state import RestoreEntity
 
+from .client import (
+    DEFAULT_MAX_CONNECTIONS, DEVICES_PATH, ZwayClient, thermostat_device_id)
+from .coordinator import (
+    FIELD_BATTERY, FIELD_MODE, FIELD_SETPOINT, NODE_DEVICE_ID,
+    ZwayCoordinator)
+from .batch import ZwayBatchReader
+from .delta import ZwayDataEngine
+from .pending import DEFAULT_PENDING_TIMEOUT, ZwayPendingWrites
+from .writer import DEFAULT_WRITE_DELAY, ZwayWriteQueue
+from .push import ZwayPushListener
+
 _LOGGER = logging.getLogger(__name__)
 
 DEFAULT_NAME = 'Zway Thermostat'
@@ -59,6 +79,7 @@ DEFAULT_AWAY_TEMP = 15
 DEFAULT_TARGET_TEMP = 21
 DEFAULT_MIN_TEMP = 4
 DEFAULT_MAX_TEMP = 40
+DEFAULT_SCAN_INTERVAL = timedelta(seconds=30)
 
 CONF_NODE = 'node'
 CONF_HOST = 'host'
@@ -70,12 +91,29 @@ CONF_MAX_TEMP = 'max_temp'
 CONF_TARGET_TEMP = 'target_temp'
 CONF_AWAY_TEMP = 'away_temp'
 CONF_INITIAL_OPERATION_MODE = 'initial_operation_mode'
+CONF_MAX_CONNECTIONS = 'max_connections'
+CONF_PUSH = 'push'
+CONF_ZWAVE_API = 'zwave_api'
+CONF_ZWAVE_RUN = 'zwave_run'
+CONF_WRITE_DELAY = 'write_delay'
+CONF_PENDING_TIMEOUT = 'pending_timeout'
+CONF_DISCOVERY = 'discovery'
+
+ATTR_BATTERY_LEVEL = 'battery_level'
+ATTR_MODE_NAME = 'mode_name'
+
+DATA_ZWAY_CLIENTS = 'zway_clients'
+DATA_ZWAY_COORDINATORS = 'zway_coordinators'
+DATA_ZWAY_WRITERS = 'zway_writers'
+DATA_ZWAY_PENDING = 'zway_pending'
+
 SUPPORT_FLAGS = (SUPPORT_TARGET_TEMPERATURE |
                  SUPPORT_OPERATION_MODE)
 
 PLATFORM_SCHEMA = PLATFORM_SCHEMA.extend({
-    vol.Required(CONF_SENSOR): cv.entity_id,
-    vol.Required(CONF_NODE): cv.positive_int,
+    vol.Optional(CONF_SENSOR): cv.entity_id,
+    vol.Optional(CONF_NODE): cv.positive_int,
+    vol.Optional(CONF_DISCOVERY, default=False): cv.boolean,
     vol.Optional(CONF_NAME, default=DEFAULT_NAME): cv.string,
     vol.Optional(CONF_HOST, default='http://127.0.0.1:8083'): cv.string,
     vol.Optional(CONF_LOGIN): cv.string,
@@ -86,6 +124,15 @@ PLATFORM_SCHEMA = PLATFORM_SCHEMA.extend({
     vol.Optional(CONF_AWAY_TEMP, default=DEFAULT_AWAY_TEMP): vol.Coerce(float),
     vol.Optional(CONF_INITIAL_OPERATION_MODE):
         vol.In([STATE_AUTO, STATE_OFF]),
+    vol.Optional(CONF_MAX_CONNECTIONS, default=DEFAULT_MAX_CONNECTIONS):
+        cv.positive_int,
+    vol.Optional(CONF_PUSH, default=False): cv.boolean,
+    vol.Optional(CONF_ZWAVE_API, default=False): cv.boolean,
+    vol.Optional(CONF_ZWAVE_RUN, default=False): cv.boolean,
+    vol.Optional(CONF_WRITE_DELAY, default=DEFAULT_WRITE_DELAY):
+        vol.Coerce(float),
+    vol.Optional(CONF_PENDING_TIMEOUT, default=DEFAULT_PENDING_TIMEOUT):
+        cv.positive_int,
 })
 
 
@@ -102,10 +149,169 @@ async def async_setup_platform(hass, config, async_add_entities,
     max_temp = config.get(CONF_MAX_TEMP)
     target_temp = config.get(CONF_TARGET_TEMP)
     initial_operation_mode = config.get(CONF_INITIAL_OPERATION_MODE)
-
+    discovery = config.get(CONF_DISCOVERY)
+
+    if not discovery and node is None:
+        _LOGGER.error('Either %s or %s must be configured',
+                      CONF_NODE, CONF_DISCOVERY)
+        return
+
+    client = async_get_client(
+        hass, host, config.get(CONF_MAX_CONNECTIONS), login, password)
+    coordinator = async_get_coordinator(
+        hass, client, config.get(CONF_SCAN_INTERVAL, DEFAULT_SCAN_INTERVAL),
+        config.get(CONF_PUSH), config.get(CONF_ZWAVE_API),
+        config.get(CONF_ZWAVE_RUN))
+    pending_writes = async_get_pending_writes(
+        hass, client, config.get(CONF_PENDING_TIMEOUT))
+    writer = async_get_writer(
+        hass, client, pending_writes, config.get(CONF_WRITE_DELAY))
+
+    if not discovery:
+        async_add_entities([ZwayThermostat(
+            hass, name, host, node, login, password, sensor_entity_id, 
+            min_temp, max_temp, target_temp, initial_operation_mode, client,
+            coordinator, writer, pending_writes)])
+        return
+
+    # One device listing creates every thermostat, with its setpoint already known
+    try:
+        thermostats = await async_discover_thermostats(client, coordinator)
+    except (aiohttp.ClientError, asyncio.TimeoutError) as ex:
+        _LOGGER.error('Unable to list the devices of %s: %s', host, ex)
+        return
+    _LOGGER.info('Discovered %d thermostats on %s', len(thermostats), host)
     async_add_entities([ZwayThermostat(
-        hass, name, host, node, login, password, sensor_entity_id, 
-        min_temp, max_temp, target_temp, initial_operation_mode)])
+        hass, '{} {}'.format(name, title), host, thermostat_node, login,
+        password, None, min_temp, max_temp, target_temp,
+        initial_operation_mode, client, coordinator, writer, pending_writes)
+        for thermostat_node, title in sorted(thermostats.items())])
+
+
+async def async_discover_thermostats(client, coordinator):
+    """Return {node: title} of every thermostat setpoint device."""
+    if isinstance(coordinator, ZwayCoordinator):
+        # The first refresh lists every device and fills the index
+        await coordinator.async_refresh()
+        devices = coordinator.devices.values()
+    else:
+        devices = (await client.async_request(DEVICES_PATH))['data']['devices']
+    thermostats = {}
+    seeds = {}
+    for device in devices:
+        match = NODE_DEVICE_ID.match(device['id'])
+        if not match:
+            continue
+        node = int(match.group(1))
+        if device['id'].endswith('-0-67-1'):
+            thermostats[node] = device['metrics'].get('title') or node
+            seeds.setdefault(node, {})[FIELD_SETPOINT] = device['metrics'].get('level')
+        elif device['id'].endswith('-0-128'):
+            seeds.setdefault(node, {})[FIELD_BATTERY] = device['metrics'].get('level')
+    if not isinstance(coordinator, ZwayCoordinator):
+        # Start the ZWaveAPI index from the listing instead of a read per entity
+        for node in thermostats:
+            coordinator.async_seed(node, seeds[node])
+    return thermostats
+
+
+@callback
+def async_get_client(hass, host, max_connections=DEFAULT_MAX_CONNECTIONS,
+                     login=None, password=None):
+    """Return the client shared by all thermostats on a controller.
+
+    The first platform entry for a controller sets its credentials. When Home
+    Assistant stops, queued setpoints are sent before the client is closed.
+    """
+    clients = hass.data.setdefault(DATA_ZWAY_CLIENTS, {})
+    if host not in clients:
+        client = clients[host] = ZwayClient(
+            host, max_connections, DEFAULT_TIMEOUT, login, password)
+
+        async def async_stop_controller(event):
+            writer = hass.data.get(DATA_ZWAY_WRITERS, {}).get(client.host)
+            if writer is not None:
+                await writer.async_flush()
+            await client.async_close()
+
+        hass.bus.async_listen_once(
+            EVENT_HOMEASSISTANT_STOP, async_stop_controller)
+    return clients[host]
+
+
+@callback
+def async_get_coordinator(hass, client, scan_interval=DEFAULT_SCAN_INTERVAL,
+                          push=False, zwave_api=False, zwave_run=False):
+    """Return the coordinator refreshing every thermostat on a controller.
+
+    The first platform entry for a controller sets its scan interval, whether
+    values come from the ZAutomation devices, the ZWaveAPI data tree or one
+    batched ZWaveAPI/Run expression, and whether it subscribes to the
+    controller's event feed. Polling only runs while the event feed is
+    disconnected.
+    """
+    coordinators = hass.data.setdefault(DATA_ZWAY_COORDINATORS, {})
+    if client.host not in coordinators:
+        if zwave_api:
+            coordinator = ZwayDataEngine(client)
+        elif zwave_run:
+            coordinator = ZwayBatchReader(client)
+        else:
+            coordinator = ZwayCoordinator(client)
+        coordinators[client.host] = coordinator
+        listener = None
+        if push and (zwave_api or zwave_run):
+            _LOGGER.warning('%s is ignored with %s and %s, the event feed '
+                            'carries ZAutomation devices', CONF_PUSH,
+                            CONF_ZWAVE_API, CONF_ZWAVE_RUN)
+        elif push:
+            listener = ZwayPushListener(client, coordinator)
+            listener.async_start()
+
+            async def async_stop_listener(event):
+                await listener.async_stop()
+
+            hass.bus.async_listen_once(
+                EVENT_HOMEASSISTANT_STOP, async_stop_listener)
+
+        async def async_refresh(now):
+            if listener is not None and listener.connected:
+                return
+            try:
+                await coordinator.async_refresh()
+            except (aiohttp.ClientError, asyncio.TimeoutError) as ex:
+                _LOGGER.error('Unable to refresh %s: %s', client.host, ex)
+
+        async_track_time_interval(hass, async_refresh, scan_interval)
+    return coordinators[client.host]
+
+
+@callback
+def async_get_writer(hass, client, pending_writes, delay=DEFAULT_WRITE_DELAY):
+    """Return the setpoint write queue of a controller.
+
+    A setpoint that could not be sent is dropped from pending_writes. Queued
+    setpoints are sent right away when Home Assistant stops, see
+    async_get_client.
+    """
+    writers = hass.data.setdefault(DATA_ZWAY_WRITERS, {})
+    if client.host not in writers:
+        async def async_send(node, value):
+            await client.async_command(
+                thermostat_device_id(node), 'exact', level=str(value))
+
+        writers[client.host] = ZwayWriteQueue(
+            hass.loop, async_send, delay, pending_writes.async_discard)
+    return writers[client.host]
+
+
+@callback
+def async_get_pending_writes(hass, client, timeout=DEFAULT_PENDING_TIMEOUT):
+    """Return the unconfirmed setpoint writes of a controller."""
+    pending = hass.data.setdefault(DATA_ZWAY_PENDING, {})
+    if client.host not in pending:
+        pending[client.host] = ZwayPendingWrites(hass.loop, timeout)
+    return pending[client.host]
 
 
 class ZwayThermostat(ClimateDevice, RestoreEntity):
@@ -113,9 +319,19 @@ class ZwayThermostat(ClimateDevice, RestoreEntity):
 
     def __init__(self, hass, name, host, node, login, password,             
                  sensor_entity_id, min_temp, max_temp, target_temp, 
-                 initial_operation_mode):
+                 initial_operation_mode, client, coordinator, writer,
+                 pending_writes):
         """Initialize the thermostat."""
         self.hass = hass
+        self._client = client
+        self._coordinator = coordinator
+        self._writer = writer
+        self._pending_writes = pending_writes
+        self._remove_listener = None
+        self._remove_pending_listener = None
+        self._device_id = thermostat_device_id(node)
+        self._battery_level = None
+        self._mode_name = None
         self._name = name
         self._node = node
         self._host = host
@@ -132,20 +348,26 @@ class ZwayThermostat(ClimateDevice, RestoreEntity):
         self._unit = hass.config.units.temperature_unit
         self._support_flags = SUPPORT_FLAGS
 
-        async_track_state_change(
-            hass, sensor_entity_id, self._async_sensor_changed)
-        
-        sensor_state = hass.states.get(sensor_entity_id)
-        if sensor_state and sensor_state.state != STATE_UNKNOWN:
-            self._async_update_temp(sensor_state)
+        if sensor_entity_id:
+            async_track_state_change(
+                hass, sensor_entity_id, self._async_sensor_changed)
+
+            sensor_state = hass.states.get(sensor_entity_id)
+            if sensor_state and sensor_state.state != STATE_UNKNOWN:
+                self._async_update_temp(sensor_state)
 
     async def async_added_to_hass(self):
         """Run when entity about to be added."""
         await super().async_added_to_hass()
+        self._remove_listener = self._coordinator.async_add_listener(
+            self._node, self._async_coordinator_updated)
+        self._remove_pending_listener = self._pending_writes.async_add_listener(
+            self._node, self._async_coordinator_updated)
+        if self._coordinator.value(self._node, FIELD_SETPOINT) is None:
+            await self.async_update()
+        else:
+            self._update_from_coordinator()
         # Check If we have an old state
-        self._data = requests.get(self._host + '/ZAutomation/api/v1/devices/ZWayVDev_zway_' + str(self._node) + '-0-67-1', timeout=DEFAULT_TIMEOUT)
-        self._json = self._data.json
-        self._target_temp = float(self._json()["data"]["metrics"]["level"])
         old_state = await self.async_get_last_state()
         if old_state is not None:
             if (self._initial_operation_mode is None and
@@ -221,7 +443,8 @@ class ZwayThermostat(ClimateDevice, RestoreEntity):
         """Set new target temperatures."""
         if kwargs.get(ATTR_TEMPERATURE) is not None:
             self._target_temp = kwargs.get(ATTR_TEMPERATURE)
-            self._data = requests.get(self._host + '/ZAutomation/api/v1/devices/ZWayVDev_zway_' + str(self._node) + '-0-67-1/command/exact?level=' + str(self._target_temp), timeout=DEFAULT_TIMEOUT)
+            self._pending_writes.async_set(self._node, self._target_temp)
+            self._writer.async_write(self._node, self._target_temp)
         await self.async_update_ha_state()
 
     @property
@@ -268,15 +491,53 @@ class ZwayThermostat(ClimateDevice, RestoreEntity):
         except ValueError as ex:
             _LOGGER.error('Unable to update from sensor: %s', ex)
 
-	
-    def update(self):
-           """Update the data from the thermostat."""
-           self._data = requests.get(self._host + '/ZAutomation/api/v1/devices/ZWayVDev_zway_' + str(self._node) + '-0-67-1', timeout=DEFAULT_TIMEOUT)
-           self._json = self._data.json
-           self._target_temp = float(self._json()["data"]["metrics"]["level"])
+    async def async_will_remove_from_hass(self):
+        """Stop listening to the coordinator and the pending writes."""
+        if self._remove_listener is not None:
+            self._remove_listener()
+            self._remove_listener = None
+        if self._remove_pending_listener is not None:
+            self._remove_pending_listener()
+            self._remove_pending_listener = None
+
+    async def async_update(self):
+        """Update the data from the thermostat."""
+        try:
+            await self._coordinator.async_refresh()
+        except (aiohttp.ClientError, asyncio.TimeoutError) as ex:
+            _LOGGER.error('Unable to read %s: %s', self._device_id, ex)
+            return
+        self._update_from_coordinator()
+
+    def _update_from_coordinator(self):
+        level = self._coordinator.value(self._node, FIELD_SETPOINT)
+        if level is not None:
+            level = float(level)
+        # An unconfirmed write stays authoritative over the reported setpoint
+        level = self._pending_writes.reconcile(self._node, level)
+        if level is not None:
+            self._target_temp = level
+        self._battery_level = self._coordinator.value(self._node, FIELD_BATTERY)
+        self._mode_name = self._coordinator.value(self._node, FIELD_MODE)
+
+    @callback
+    def _async_coordinator_updated(self):
+        """Handle a change on the controller or a dropped pending write."""
+        self._update_from_coordinator()
+        self.async_schedule_update_ha_state()
 
     @property
     def supported_features(self):
         """Return the list of supported features."""
         return self._support_flags
 
+    @property
+    def device_state_attributes(self):
+        """Return the battery level and mode reported by the valve."""
+        attributes = {}
+        if self._battery_level is not None:
+            attributes[ATTR_BATTERY_LEVEL] = self._battery_level
+        if self._mode_name is not None:
+            attributes[ATTR_MODE_NAME] = self._mode_name
+        return attributes
+
@@ -0,0 +1,68 @@
+"""
+Update coordinator for all thermostats on one Z-Way controller.
+
+One ``devices?since=<updateTime>`` request per cycle returns only the
+virtual devices that changed since the previous cycle. They are merged into
+an in-memory index that entities read from, so the request count per cycle
+does not grow with the number of valves. Changes are routed to the entity of
+the node a virtual device belongs to.
+"""
+
+import logging
+import re
+
+from .client import DEVICES_PATH, battery_device_id, thermostat_device_id
+from .source import ZwaySource
+
+_LOGGER = logging.getLogger(__name__)
+
+FIELD_SETPOINT = 'setpoint'
+FIELD_MODE = 'mode'
+FIELD_BATTERY = 'battery'
+
+NODE_DEVICE_ID = re.compile(r'^ZWayVDev_zway_(\d+)-')
+
+
+class ZwayCoordinator(ZwaySource):
+    """Incremental device index of one Z-Way controller."""
+
+    def __init__(self, client):
+        """Initialize an empty index, filled by the first refresh."""
+        super().__init__(client)
+        self._since = 0
+        self.devices = {}
+
+    def level(self, device_id):
+        """Return metrics.level of a device, or None if it is unknown."""
+        device = self.devices.get(device_id)
+        if device is None:
+            return None
+        return device['metrics'].get('level')
+
+    def value(self, node, field):
+        """Return a thermostat field of node, or None if it is unknown."""
+        if field == FIELD_SETPOINT:
+            return self.level(thermostat_device_id(node))
+        if field == FIELD_BATTERY:
+            return self.level(battery_device_id(node))
+        return None
+
+    async def _async_fetch(self):
+        body = await self._client.async_request(
+            DEVICES_PATH, {'since': self._since})
+        data = body['data']
+        devices = data.get('devices', [])
+        self._since = data.get('updateTime', self._since)
+        _LOGGER.debug('%d devices changed on %s', len(devices),
+                      self._client.host)
+        self.async_apply(devices)
+
+    def async_apply(self, devices):
+        """Merge changed device documents and notify their listeners."""
+        nodes = set()
+        for device in devices:
+            self.devices[device['id']] = device
+            match = NODE_DEVICE_ID.match(device['id'])
+            if match:
+                nodes.add(int(match.group(1)))
+        self._async_notify(nodes)
@@ -0,0 +1,74 @@
+"""
+Incremental reader of the Z-Way ZWaveAPI data tree.
+
+``ZWaveAPI/Data/<updateTime>`` returns only the data holders that changed
+since updateTime, keyed by their dotted path (``ZWaveAPI/Data/0`` returns the
+whole tree). Every watched path is indexed under each of its prefixes, so a
+changed holder is resolved to the entity fields below it with one dict
+lookup instead of a walk over the whole tree.
+"""
+
+import logging
+
+from .client import DATA_PATH
+from .coordinator import FIELD_BATTERY, FIELD_MODE, FIELD_SETPOINT
+from .source import ZwayFieldIndex
+
+_LOGGER = logging.getLogger(__name__)
+
+
+def thermostat_paths(node):
+    """Return {data tree path: field} for the thermostat of node."""
+    prefix = 'devices.{}.instances.0.commandClasses.'.format(node)
+    return {
+        prefix + '67.data.1.val': FIELD_SETPOINT,
+        prefix + '67.data.1.modeName': FIELD_MODE,
+        prefix + '128.data.last': FIELD_BATTERY,
+    }
+
+
+class ZwayDataEngine(ZwayFieldIndex):
+    """Thermostat fields kept current from ZWaveAPI/Data changes."""
+
+    def __init__(self, client):
+        """Initialize with no paths indexed, the first fetch reads the tree."""
+        super().__init__(client)
+        self._since = 0
+        self._prefixes = {}
+
+    def _add_node(self, node):
+        # Index the data tree paths of node's thermostat
+        for path, field in thermostat_paths(node).items():
+            segments = path.split('.')
+            for depth in range(len(segments) + 1):
+                self._prefixes.setdefault('.'.join(segments[:depth]), []).append(
+                    (segments[depth:], node, field))
+        # Fields of a node added later are only in the full tree
+        self._since = 0
+
+    async def _async_fetch(self):
+        since = self._since
+        body = await self._client.async_request(DATA_PATH + str(since))
+        # Keep a reset from async_watch made while the request was in flight
+        if self._since == since:
+            self._since = body.get('updateTime', since)
+        self.async_apply({'': body} if since == 0 else body)
+
+    def async_apply(self, changes):
+        """Apply {path: data holder} changes and notify changed nodes."""
+        nodes = set()
+        for path, holder in changes.items():
+            for segments, node, field in self._prefixes.get(path, ()):
+                value = holder
+                for segment in segments:
+                    if not isinstance(value, dict):
+                        break
+                    value = value.get(segment)
+                if not isinstance(value, dict) or 'value' not in value:
+                    continue
+                if self._values[node].get(field) != value['value']:
+                    self._values[node][field] = value['value']
+                    nodes.add(node)
+        _LOGGER.debug('%d paths changed on %s, %d nodes updated',
+                      len(changes), self._client.host, len(nodes))
+        self._async_notify(nodes)
@@ -0,0 +1,80 @@
+"""
+Pending setpoint writes awaiting confirmation from the valves.
+
+A sleeping valve keeps reporting its old setpoint until it wakes up and
+takes the queued command. Until the controller reports the written value, the
+write expires or sending it fails, the written value stays authoritative so
+polls do not flip the entity back. Listeners hear when a write is dropped,
+since the controller may never report a change that would show it.
+"""
+
+import logging
+
+_LOGGER = logging.getLogger(__name__)
+
+DEFAULT_PENDING_TIMEOUT = 600
+TOLERANCE = 0.05
+
+
+class ZwayPendingWrites:
+    """Per-node cache of setpoints written but not yet confirmed."""
+
+    def __init__(self, loop, timeout=DEFAULT_PENDING_TIMEOUT):
+        """Initialize an empty cache."""
+        self._loop = loop
+        self._timeout = timeout
+        self._pending = {}
+        self._listeners = {}
+
+    def async_add_listener(self, node, update_callback):
+        """Call update_callback when a pending write of node is dropped.
+
+        Returns a function that removes the listener.
+        """
+        listeners = self._listeners.setdefault(node, [])
+        listeners.append(update_callback)
+        return lambda: listeners.remove(update_callback)
+
+    def async_set(self, node, value):
+        """Record value as written to node."""
+        self._cancel(node)
+        self._pending[node] = (value, self._loop.call_later(
+            self._timeout, self._async_expire, node, value))
+
+    def async_discard(self, node, value):
+        """Drop the pending write of value to node, e.g. when sending failed."""
+        if self.get(node) != value:
+            return
+        _LOGGER.debug('Node %s dropped pending setpoint %s', node, value)
+        self._async_drop(node)
+
+    def _async_expire(self, node, value):
+        _LOGGER.warning('Node %s did not confirm setpoint %s', node, value)
+        self._async_drop(node)
+
+    def _async_drop(self, node):
+        self._cancel(node)
+        for update_callback in list(self._listeners.get(node, ())):
+            update_callback()
+
+    def _cancel(self, node):
+        pending = self._pending.pop(node, None)
+        if pending is not None:
+            pending[1].cancel()
+
+    def get(self, node):
+        """Return the pending value of node, or None."""
+        pending = self._pending.get(node)
+        return None if pending is None else pending[0]
+
+    def reconcile(self, node, reported):
+        """Return the value to show for node given the reported value."""
+        pending = self._pending.get(node)
+        if pending is None:
+            return reported
+        value = pending[0]
+        if reported is not None and abs(reported - value) < TOLERANCE:
+            _LOGGER.debug('Node %s confirmed setpoint %s', node, value)
+            self._cancel(node)
+            return reported
+        return value
@@ -0,0 +1,90 @@
+"""
+Push updates from a Z-Way controller's websocket event feed.
+
+The controller broadcasts ``me.z-wave.devices.level_update`` with the full
+device document whenever a virtual device changes. The listener merges those
+documents into the coordinator, which routes them to the entity of the node.
+The connection is re-opened with backoff; while it is down the coordinator
+keeps polling.
+"""
+
+import asyncio
+import json
+import logging
+
+import aiohttp
+
+_LOGGER = logging.getLogger(__name__)
+
+EVENT_LEVEL_UPDATE = 'me.z-wave.devices.level_update'
+RECONNECT_MIN_DELAY = 1
+RECONNECT_MAX_DELAY = 60
+
+
+class ZwayPushListener:
+    """Websocket subscription feeding a ZwayCoordinator."""
+
+    def __init__(self, client, coordinator):
+        """Initialize the listener, it connects once started."""
+        self._client = client
+        self._coordinator = coordinator
+        self._task = None
+        self.connected = False
+
+    def async_start(self):
+        """Start listening in the background."""
+        if self._task is None:
+            self._task = asyncio.ensure_future(self._async_run())
+
+    async def async_stop(self):
+        """Close the connection and stop reconnecting."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _async_run(self):
+        delay = RECONNECT_MIN_DELAY
+        while True:
+            try:
+                await self._async_listen()
+                delay = RECONNECT_MIN_DELAY
+            except (aiohttp.ClientError, asyncio.TimeoutError) as ex:
+                _LOGGER.warning('Z-Way event feed of %s failed: %s',
+                                self._client.host, ex)
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, RECONNECT_MAX_DELAY)
+
+    async def _async_listen(self):
+        websocket = await self._client.async_ws_connect()
+        try:
+            self.connected = True
+            _LOGGER.debug('Z-Way event feed of %s connected',
+                          self._client.host)
+            # Catch up on changes missed while disconnected
+            await self._coordinator.async_refresh()
+            async for message in websocket:
+                if message.type == aiohttp.WSMsgType.TEXT:
+                    self._handle(message.data)
+                elif message.type == aiohttp.WSMsgType.ERROR:
+                    break
+        finally:
+            self.connected = False
+            await websocket.close()
+
+    def _handle(self, text):
+        try:
+            message = json.loads(text)
+            if message.get('event') != EVENT_LEVEL_UPDATE:
+                return
+            device = message['data']
+            if isinstance(device, str):
+                device = json.loads(device)
+        except (ValueError, KeyError, AttributeError) as ex:
+            _LOGGER.debug('Ignoring Z-Way event %r: %s', text, ex)
+            return
+        if 'id' in device and 'metrics' in device:
+            self._coordinator.async_apply([device])
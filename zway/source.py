@@ -0,0 +1,90 @@
+"""
+Base classes of the state sources thermostat entities read from.
+
+A source holds the last known state of the thermostats on one controller and
+refreshes it with one request at a time, however many entities ask for a
+refresh. Entities read fields with value() and hear about changes through
+listeners; each source only fetches and applies its own data format.
+"""
+
+import asyncio
+
+
+class ZwaySource:
+    """Single-flight refresh and per-node listeners of one controller."""
+
+    def __init__(self, client):
+        """Initialize a source reading through client."""
+        self._client = client
+        self._refresh = None
+        self._listeners = {}
+
+    def async_watch(self, node):
+        """Include node in later refreshes."""
+
+    def value(self, node, field):
+        """Return a thermostat field of node, or None if it is unknown."""
+        raise NotImplementedError
+
+    def async_add_listener(self, node, update_callback):
+        """Call update_callback whenever node changes.
+
+        Returns a function that removes the listener.
+        """
+        self.async_watch(node)
+        listeners = self._listeners.setdefault(node, [])
+        listeners.append(update_callback)
+        return lambda: listeners.remove(update_callback)
+
+    async def async_refresh(self):
+        """Fetch from the controller, joining a refresh already running."""
+        if self._refresh is None:
+            self._refresh = asyncio.ensure_future(self._async_fetch())
+            self._refresh.add_done_callback(self._refresh_done)
+        await asyncio.shield(self._refresh)
+
+    def _refresh_done(self, future):
+        if self._refresh is future:
+            self._refresh = None
+
+    async def _async_fetch(self):
+        raise NotImplementedError
+
+    def _async_notify(self, nodes):
+        for node in nodes:
+            for update_callback in list(self._listeners.get(node, ())):
+                update_callback()
+
+
+class ZwayFieldIndex(ZwaySource):
+    """Source keeping the thermostat fields of each watched node."""
+
+    def __init__(self, client):
+        """Initialize an empty index, nodes are added with async_watch."""
+        super().__init__(client)
+        self._values = {}
+
+    def async_watch(self, node):
+        """Include node in later refreshes."""
+        if node in self._values:
+            return
+        self._values[node] = {}
+        self._add_node(node)
+
+    def _add_node(self, node):
+        pass
+
+    def async_seed(self, node, values):
+        """Fill the unknown fields of node from {field: value}.
+
+        Used with the device listing read at discovery, so entities start
+        with a setpoint before the first refresh.
+        """
+        self.async_watch(node)
+        for field, value in values.items():
+            if value is not None:
+                self._values[node].setdefault(field, value)
+
+    def value(self, node, field):
+        """Return a thermostat field of node, or None if it is unknown."""
+        return self._values.get(node, {}).get(field)
@@ -0,0 +1,74 @@
+"""
+Write-behind queue for thermostat setpoints.
+
+Battery-powered valves only take commands when they wake up, so every
+setpoint sent to the controller waits in its queue. Writes are held back for
+a short delay per node and a newer write replaces the one still waiting, so
+only the last setpoint of a burst reaches the controller. A value that could
+not be sent is handed to the failure callback.
+"""
+
+import asyncio
+import logging
+
+import aiohttp
+
+_LOGGER = logging.getLogger(__name__)
+
+DEFAULT_WRITE_DELAY = 2
+
+
+class ZwayWriteQueue:
+    """Debounced, last-write-wins setpoint writes, one slot per node."""
+
+    def __init__(self, loop, send, delay=DEFAULT_WRITE_DELAY, failed=None):
+        """Initialize the queue.
+
+        send is a coroutine function taking (node, value), failed an
+        optional callback taking the (node, value) that could not be sent.
+        """
+        self._loop = loop
+        self._send = send
+        self._delay = delay
+        self._failed = failed
+        self._timers = {}
+        self._locks = {}
+        self.superseded = 0
+
+    def async_write(self, node, value):
+        """Queue value for node, replacing a value still waiting."""
+        timer = self._timers.pop(node, None)
+        if timer is not None:
+            timer[1].cancel()
+            self.superseded += 1
+        self._timers[node] = (value, self._loop.call_later(
+            self._delay, self._async_flush_node, node))
+
+    def _async_flush_node(self, node):
+        value, _ = self._timers.pop(node)
+        self._loop.create_task(self._async_send(node, value))
+
+    async def _async_send(self, node, value):
+        lock = self._locks.setdefault(node, asyncio.Lock())
+        async with lock:
+            # A newer value queued while the previous write was in flight wins
+            if node in self._timers:
+                self.superseded += 1
+                return
+            try:
+                await self._send(node, value)
+            except (aiohttp.ClientError, asyncio.TimeoutError) as ex:
+                _LOGGER.error('Unable to write %s to node %s: %s',
+                              value, node, ex)
+                if self._failed is not None:
+                    self._failed(node, value)
+
+    async def async_flush(self):
+        """Send every queued value now."""
+        nodes = list(self._timers)
+        for node in nodes:
+            self._timers[node][1].cancel()
+        sends = [self._async_send(node, self._timers.pop(node)[0])
+                 for node in nodes]
+        if sends:
+            await asyncio.gather(*sends)